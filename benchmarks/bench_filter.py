@@ -0,0 +1,51 @@
+"""Micro-benchmarks of the psycopg filter, which runs for every `{{ }}` block.
+
+The `isinstance(IntoSql)` rows show the cost of the runtime-checkable Protocol check
+that the filter used to do for every value, compared with the per-type lookup.
+
+Usage: `python benchmarks/bench_filter.py`
+"""
+
+from dataclasses import dataclass
+
+from psycopg.sql import Identifier
+
+from jinja_psycopg.renderer import CONTEXT, psycopg_filter
+from jinja_psycopg.sql import IntoSql, get_sql_adapter
+from run import best_time
+
+
+@dataclass
+class Table:
+    schema: str
+    name: str
+
+    def __sql__(self):
+        return Identifier(self.schema, self.name)
+
+
+VALUES = {
+    "int": 5,
+    "str": "text",
+    "Identifier": Identifier("foo"),
+    "__sql__ dataclass": Table("public", "foo"),
+}
+
+
+def main():
+    for name, value in VALUES.items():
+        with CONTEXT.recorder("b"):
+            filter_time = best_time(lambda: psycopg_filter(value))
+
+        cls = type(value)
+        cases = {
+            "psycopg_filter": filter_time,
+            "isinstance(IntoSql)": best_time(lambda: isinstance(value, IntoSql)),
+            "get_sql_adapter": best_time(lambda: get_sql_adapter(cls)),
+        }
+        for case, seconds in cases.items():
+            print(f"{name:<18} {case:<20} {seconds * 1e9:8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Offline benchmark suite for the compile, render, module and join paths.
+
+Usage:
+
+    python benchmarks/run.py                        # run and print the results
+    python benchmarks/run.py --save baseline.json   # save the results
+    python benchmarks/run.py --compare baseline.json [--threshold 0.15]
+
+In comparison mode, the exit code is 1 if any benchmark
+got slower than the baseline by more than the threshold.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, NamedTuple
+
+from psycopg.sql import Identifier
+
+from jinja_psycopg import JinjaPsycopg
+from jinja_psycopg.offline import DEFAULT_CONTEXT
+from jinja_psycopg.renderer import escape_percents
+from jinja_psycopg.sql import sql_join_filter
+
+POINT_QUERY = "SELECT * FROM {{ table }} WHERE id = {{ id }}"
+
+SELECT_QUERY = """\
+SELECT {{ columns | sqljoin(', ') }}
+FROM {{ table }}
+WHERE {% for column in filters %}{{ column }} = {{ loop.index }}{% if not loop.last %} AND {% endif %}{% endfor %}"""
+
+WIDE_SELECT_QUERY = "SELECT {{ columns | sqljoin(', ') }} FROM {{ table }}"
+
+DDL_STATEMENT = """\
+CREATE TABLE {{ schema }}.{{ 'table_%d' | sql }} (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT {{ 'unnamed' }},
+    pattern TEXT CHECK (pattern LIKE '%%'),
+    {% for column in columns -%}
+    {{ column }} TEXT{% if not loop.last %},{% endif %}
+    {% endfor %}
+);
+"""
+
+
+def make_ddl(size: int) -> str:
+    """Generated DDL template of approximately `size` characters"""
+    statements = []
+    length = 0
+    while length < size:
+        statement = DDL_STATEMENT.replace("%d", str(len(statements)))
+        statements.append(statement)
+        length += len(statement)
+
+    return "".join(statements)
+
+
+def columns(count: int) -> list[Identifier]:
+    return [Identifier(f"column_{i}") for i in range(count)]
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: Callable[[], Any]
+
+
+def benchmarks() -> list[Benchmark]:
+    renderer = JinjaPsycopg()
+    result = []
+
+    point = renderer.from_string(POINT_QUERY)
+    point_params = {"table": Identifier("items"), "id": 5}
+    result += [
+        Benchmark("from_string/point", lambda: renderer.from_string(POINT_QUERY)),
+        Benchmark("render/point", lambda: point.render(point_params)),
+        Benchmark(
+            "render_cached/point", lambda: renderer.render(POINT_QUERY, point_params)
+        ),
+    ]
+
+    select = renderer.from_string(SELECT_QUERY)
+    for count in [10, 100, 1000]:
+        params = {
+            "columns": columns(count),
+            "table": Identifier("items"),
+            "filters": columns(count),
+        }
+        rendered = select.render(params)
+        result += [
+            Benchmark(f"render/select-{count}-args", lambda p=params: select.render(p)),
+            Benchmark(
+                f"as_string/select-{count}-args", lambda r=rendered: r.as_string(None)
+            ),
+            Benchmark(
+                f"offline/select-{count}-args",
+                lambda r=rendered: DEFAULT_CONTEXT.as_string(r),
+            ),
+        ]
+
+    wide = renderer.from_string(WIDE_SELECT_QUERY)
+    for count in [100, 1000, 10_000]:
+        params = {"columns": columns(count), "table": Identifier("items")}
+        rendered = wide.render(params)
+        result += [
+            Benchmark(f"render/wide-select-{count}", lambda p=params: wide.render(p)),
+            Benchmark(
+                f"as_bytes/wide-select-{count}", lambda r=rendered: r.as_bytes(None)
+            ),
+        ]
+
+    for size in [1_000, 10_000, 100_000]:
+        source = make_ddl(size)
+        template = renderer.from_string(source)
+        params = {"schema": Identifier("public"), "columns": columns(10)}
+        rendered = template.render(params)
+        label = f"{size // 1000}kb"
+
+        result += [
+            Benchmark(
+                f"from_string/ddl-{label}", lambda s=source: renderer.from_string(s)
+            ),
+            Benchmark(f"render/ddl-{label}", lambda t=template, p=params: t.render(p)),
+            Benchmark(
+                f"module/ddl-{label}",
+                lambda t=template, p=params: t.make_module(p).render(),
+            ),
+            Benchmark(
+                f"escape_percents/ddl-{label}", lambda r=rendered: escape_percents(r)
+            ),
+        ]
+
+    for count in [10, 1000, 10_000]:
+        idents = columns(count)
+        result.append(
+            Benchmark(f"sqljoin/{count}", lambda i=idents: sql_join_filter(i, ", "))
+        )
+
+    return result
+
+
+def best_time(func: Callable[[], Any]) -> float:
+    """Seconds per call: the best of 5 repeats of as many calls as fit into timeit's autorange"""
+    number, _ = timeit.Timer(func).autorange()
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def measure(func: Callable[[], Any]) -> dict[str, float]:
+    best = best_time(func)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"ops_per_sec": 1 / best, "peak_bytes": peak}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print the change relative to the baseline
+
+    Returns:
+        whether no benchmark regressed by more than the threshold
+    """
+    ok = True
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<32} (new)")
+            continue
+
+        change = result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1
+        regressed = change < -threshold
+        ok = ok and not regressed
+
+        print(f"{name:<32} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--save", help="save the results to a JSON file")
+    parser.add_argument("--compare", help="compare with results saved in a JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="slowdown considered a regression, default 0.15 (15%%)",
+    )
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks containing this string"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for benchmark in benchmarks():
+        if args.filter not in benchmark.name:
+            continue
+
+        result = measure(benchmark.func)
+        results[benchmark.name] = result
+        print(
+            f"{benchmark.name:<32} {result['ops_per_sec']:12.1f} ops/s"
+            f" {result['peak_bytes'] / 1024:10.1f} KiB peak"
+        )
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        print()
+        return 0 if compare(results, baseline, args.threshold) else 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Callable, Generic, Hashable, NamedTuple, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheInfo(NamedTuple):
+    """Cache statistics, similar to [functools.lru_cache][]'s `cache_info()`"""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: Optional[int]
+    currsize: int
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: Optional[int] = 128) -> None:
+        """Thread-safe least recently used cache with hit/miss/eviction counters
+
+        Args:
+            maxsize: maximum number of entries,
+                `None` for an unbounded cache, `0` to disable caching
+        """
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be non-negative or None")
+
+        self._maxsize = maxsize
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        Args:
+            key: cache key
+
+        Returns:
+            cached value, or `None` if the key is missing
+        """
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._data.move_to_end(key)
+
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        """Store a value, evicting the least recently used entries if the cache is full
+
+        Args:
+            key: cache key
+            value: value to store
+        """
+        if self._maxsize == 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if self._maxsize is not None:
+                while len(self._data) > self._maxsize:
+                    self._data.popitem(last=False)
+                    self._evictions += 1
+
+    def invalidate(self, key: K) -> bool:
+        """
+        Args:
+            key: cache key
+
+        Returns:
+            whether the key was present
+        """
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._data.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self) -> CacheInfo:
+        """
+        Returns:
+            current cache statistics
+        """
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self._maxsize,
+                len(self._data),
+            )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TTLCache(LRUCache[K, V]):
+    def __init__(
+        self,
+        maxsize: Optional[int] = 128,
+        max_total_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[V], int] = lambda value: 1,
+    ) -> None:
+        """Thread-safe least recently used cache whose entries expire after `ttl` seconds,
+        and whose entries' total size is bounded
+
+        Args:
+            maxsize: maximum number of entries,
+                `None` for an unbounded cache, `0` to disable caching
+            max_total_size: maximum sum of the sizes of the entries, `None` for no limit.
+                Values larger than this aren't cached
+            ttl: seconds after which an entry expires, `None` to keep entries until evicted
+            sizeof: size of a value
+        """
+        super().__init__(maxsize)
+        self._max_total_size = max_total_size
+        self._ttl = ttl
+        self._sizeof = sizeof
+        self._total_size = 0
+
+        # Values are stored as (value, size, expiry time)
+        self._entries: OrderedDict[K, tuple[V, int, float]] = self._data  # type:ignore
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < monotonic():
+                self._remove(key)
+                self._evictions += 1
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        if self._maxsize == 0:
+            return
+
+        size = self._sizeof(value)
+        if self._max_total_size is not None and size > self._max_total_size:
+            return
+
+        expires = monotonic() + self._ttl if self._ttl is not None else float("inf")
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, expires)
+            self._total_size += size
+
+            while (
+                self._maxsize is not None and len(self._entries) > self._maxsize
+            ) or (
+                self._max_total_size is not None
+                and self._total_size > self._max_total_size
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._total_size -= evicted_size
+                self._evictions += 1
+
+    def invalidate(self, key: K) -> bool:
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_size = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def total_size(self) -> int:
+        """
+        Returns:
+            sum of the sizes of the cached values
+        """
+        return self._total_size
+
+    def _remove(self, key: K) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+
+        self._total_size -= entry[1]
+        return True
@@ -1,19 +1,62 @@
 from __future__ import annotations
+import threading
+from contextlib import contextmanager
 from contextvars import ContextVar
-from typing import Optional, Any
+from typing import Iterator, Literal, Optional, Any
+
+from psycopg.sql import Placeholder
+
+ParamStyle = Literal["positional", "named"]
+"""
+Placeholder style used for bound parameters:
+`%s` for `positional` and `%(name)s` for `named`
+"""
+
+
+class BoundParam(Placeholder):
+    def __init__(self, value: Any) -> None:
+        """Positional placeholder that carries its parameter.
+
+        [compose][jinja_psycopg.renderer.compose] builds the list of parameters from these,
+        in the order the placeholders appear in the output,
+        since a captured value may be output in a different order, or more than once
+
+        Args:
+            value: bound parameter
+        """
+        super().__init__()
+        self.value = value
 
 
 class FormatArgs:
-    def __init__(self, prefix: str) -> None:
-        """Data structure for recording values in jinja blocks to be formatted by psycopg
+    __slots__ = ("_keys", "_values", "_positional", "_params")
+
+    def __init__(
+        self,
+        prefix: str,
+        param_style: Optional[ParamStyle] = None,
+        delimiter: str = "",
+    ) -> None:
+        """Data structure for recording values in jinja blocks to be formatted by psycopg.
+        Values are stored in a list, and their keys encode the position in that list
 
         Args:
-            prefix: Prefix used in dictionary keys
+            prefix: Prefix used in keys
+            param_style: if set, literal values are recorded as bound parameters
+                instead of being formatted into the query.
+                Positional parameters are recorded as [BoundParam][jinja_psycopg.context.BoundParam]s
+            delimiter: string placed around every key
         """
 
-        self._prefix = prefix
-        self._dictionary = {}
-        self._num_values = 0
+        self._keys = _key_cache(prefix, delimiter)
+        self._values: list[Any] = []
+
+        self._positional = param_style == "positional"
+        self._params: Optional[dict[str, Any]] = None
+        if param_style == "named":
+            self._params = {}
+        elif param_style is not None and not self._positional:
+            raise ValueError(f"Unknown param_style: {param_style!r}")
 
     def save_value(self, value: Any) -> str:
         """
@@ -21,32 +64,127 @@ class FormatArgs:
             value: value to save
 
         Returns:
-            generated key in the format of `prefix#number`
+            generated key in the format of `{delimiter}{prefix}{index}{delimiter}`
+        """
+        index = len(self._values)
+        self._values.append(value)
+
+        try:
+            return self._keys[index]
+        except IndexError:
+            return self._keys.grow(index)
+
+    def bind_param(self, value: Any) -> Any:
+        """
+        Args:
+            value: literal value
+
+        Returns:
+            a [psycopg.sql.Placeholder][] if parameters are being bound,
+                otherwise the value itself
+        """
+        if self._positional:
+            return BoundParam(value)
+        elif self._params is not None:
+            name = f"p{len(self._params)}"
+            self._params[name] = value
+            return Placeholder(name)
+
+        return value
+
+    def mark(self) -> tuple[int, int]:
+        """
+        Returns:
+            number of saved values and named parameters,
+                for [truncate][jinja_psycopg.context.FormatArgs.truncate]
         """
-        key = f"{self._prefix}#{self._num_values}"
-        self._dictionary[key] = value
+        return len(self._values), len(self._params) if self._params is not None else 0
 
-        self._num_values += 1
-        return key
+    def truncate(self, mark: tuple[int, int]) -> None:
+        """Forget the values and parameters saved since the mark was taken
+
+        Args:
+            mark: result of [mark][jinja_psycopg.context.FormatArgs.mark]
+        """
+        values, params = mark
+        del self._values[values:]
+
+        if self._params is not None:
+            while len(self._params) > params:
+                self._params.popitem()
 
     @property
-    def dictionary(self) -> dict:
+    def values(self) -> list[Any]:
         """
         Returns:
-            saved values
+            saved values, indexed by the number in their key
         """
-        return self._dictionary
+        return self._values
+
+    @property
+    def params(self) -> Optional[dict[str, Any]]:
+        """
+        Returns:
+            named parameters, or `None` if they weren't being bound
+        """
+        return self._params
+
+
+# Keys past this index are built on every call instead of being cached,
+# so that one very long render doesn't keep its keys around for good
+_MAX_CACHED_KEYS = 4096
+
+
+class _KeyCache(list):
+    # Keys are the same for every render, so they're built once and shared.
+    # Reads don't need the lock, since keys are only ever appended
+
+    def __init__(self, prefix: str, delimiter: str) -> None:
+        super().__init__()
+        self._prefix = prefix
+        self._delimiter = delimiter
+        self._lock = threading.Lock()
+
+    def grow(self, index: int) -> str:
+        if index >= _MAX_CACHED_KEYS:
+            return f"{self._delimiter}{self._prefix}{index}{self._delimiter}"
+
+        with self._lock:
+            while len(self) <= index:
+                self.append(
+                    f"{self._delimiter}{self._prefix}{len(self)}{self._delimiter}"
+                )
+
+        return self[index]
+
+
+# One cache per prefix and delimiter, of which there are only a few
+_KEY_CACHES: dict[tuple[str, str], _KeyCache] = {}
+_KEY_CACHES_LOCK = threading.Lock()
+
+
+def _key_cache(prefix: str, delimiter: str) -> _KeyCache:
+    keys = _KEY_CACHES.get((prefix, delimiter))
+    if keys is None:
+        with _KEY_CACHES_LOCK:
+            keys = _KEY_CACHES.setdefault(
+                (prefix, delimiter), _KeyCache(prefix, delimiter)
+            )
+
+    return keys
 
 
 class FormatArgsContext:
-    def __init__(self, name: str) -> None:
+    def __init__(self, name: str, delimiter: str = "") -> None:
         """Wrapper for [contextvars.ContextVar][] used for saving format args from within
             [`psycopg`][jinja_psycopg.renderer.psycopg_filter] filter and for creating argument recorders
 
         Args:
             name: name used by the ContextVar
+            delimiter: string placed around the keys of saved values
         """
         self._context_var = ContextVar[Optional[FormatArgs]](name, default=None)
+        self._delimiter = delimiter
 
     def save_value(self, value: Any) -> str:
         """
@@ -54,7 +192,7 @@ class FormatArgsContext:
             value: value to save
 
         Returns:
-            generated key in the format of `prefix#number`
+            generated key, see [FormatArgs.save_value][jinja_psycopg.context.FormatArgs.save_value]
 
         Raises:
             RuntimeError: if ContextVar was empty
@@ -68,48 +206,139 @@ class FormatArgsContext:
 
         return context.save_value(value)
 
-    def recorder(self, prefix: str) -> FormatArgsRecorder:
+    def bind_param(self, value: Any) -> Any:
+        """
+        Args:
+            value: literal value
+
+        Returns:
+            a [psycopg.sql.Placeholder][] if the current recorder binds parameters,
+                otherwise the value itself
+
+        Raises:
+            RuntimeError: if ContextVar was empty
+        """
+
+        context = self._context_var.get()
+        if context is None:
+            raise RuntimeError(
+                "Called ContextWriter.bind_param, but no context was found"
+            )
+
+        return context.bind_param(value)
+
+    def mark(self) -> tuple[int, int]:
+        """
+        Returns:
+            position of the current recorder, see [FormatArgs.mark][jinja_psycopg.context.FormatArgs.mark]
+
+        Raises:
+            RuntimeError: if ContextVar was empty
+        """
+
+        context = self._context_var.get()
+        if context is None:
+            raise RuntimeError("Called ContextWriter.mark, but no context was found")
+
+        return context.mark()
+
+    def truncate(self, mark: tuple[int, int]) -> None:
         """
         Args:
-            prefix: Prefix for the keys in the resulting dictionary
+            mark: result of [mark][jinja_psycopg.context.FormatArgsContext.mark]
+
+        Raises:
+            RuntimeError: if ContextVar was empty
+        """
+
+        context = self._context_var.get()
+        if context is None:
+            raise RuntimeError(
+                "Called ContextWriter.truncate, but no context was found"
+            )
+
+        context.truncate(mark)
+
+    @contextmanager
+    def suspend(self) -> Iterator[None]:
+        """Context manager that stops recording within its scope,
+        so that [save_value][jinja_psycopg.context.FormatArgsContext.save_value] raises
+        """
+        token = self._context_var.set(None)
+        try:
+            yield
+        finally:
+            self._context_var.reset(token)
+
+    def recorder(
+        self, prefix: str, param_style: Optional[ParamStyle] = None
+    ) -> FormatArgsRecorder:
+        """
+        Args:
+            prefix: Prefix for the keys of the recorded values
+            param_style: if set, record literal values as bound parameters
 
         Returns:
             new recorder with the given prefix
         """
-        return FormatArgsRecorder(self._context_var, prefix)
+        return FormatArgsRecorder(
+            self._context_var, prefix, param_style, self._delimiter
+        )
 
 
 class FormatArgsRecorder:
+    __slots__ = (
+        "_context_var",
+        "_prefix",
+        "_param_style",
+        "_delimiter",
+        "_recorded",
+        "_params",
+        "_token",
+    )
+
     def __init__(
-        self, context_var: ContextVar[Optional[FormatArgs]], prefix: str
+        self,
+        context_var: ContextVar[Optional[FormatArgs]],
+        prefix: str,
+        param_style: Optional[ParamStyle] = None,
+        delimiter: str = "",
     ) -> None:
         """[contextvars.ContextVar][] wrapper that works as a context manager
-        and records arguments saved within its scope into a dictionary
+        and records arguments saved within its scope into a list
 
         Args:
             context_var: Inner ContextVar
-            prefix: Prefix used in dictionary keys
+            prefix: Prefix used in keys
+            param_style: if set, record literal values as bound parameters
+            delimiter: string placed around every key
         """
 
         self._context_var = context_var
         self._prefix = prefix
-        self._recorded = None
+        self._param_style = param_style
+        self._delimiter = delimiter
+        self._recorded: Optional[list[Any]] = None
+        self._params: Optional[dict[str, Any]] = None
 
-    def __enter__(self):
-        self._token = self._context_var.set(FormatArgs(self._prefix))
+    def __enter__(self) -> FormatArgs:
+        format_args = FormatArgs(self._prefix, self._param_style, self._delimiter)
+        self._token = self._context_var.set(format_args)
+        return format_args
 
     def __exit__(self, type, value, traceback):
         context = self._context_var.get()
         if context is None:
             raise RuntimeError("Finished recording, but ContextVar was empty")
 
-        self._recorded = context.dictionary
+        self._recorded = context.values
+        self._params = context.params
         self._context_var.reset(self._token)
 
-    def unwrap(self) -> dict[str, Any]:
+    def unwrap(self) -> list[Any]:
         """
         Returns:
-            the recorded arguments
+            the recorded arguments, indexed by the number in their key
 
         Raises:
             RuntimeError: if nothing was recorded
@@ -120,3 +349,19 @@ class FormatArgsRecorder:
             )
 
         return self._recorded
+
+    def unwrap_params(self) -> dict[str, Any]:
+        """
+        Returns:
+            the recorded named parameters. Positional parameters are collected by
+                [compose][jinja_psycopg.renderer.compose] instead
+
+        Raises:
+            RuntimeError: if nothing was recorded or named parameters weren't being bound
+        """
+        if self._params is None:
+            raise RuntimeError(
+                "Called ContextDictRecorder.unwrap_params(), but no parameters were bound"
+            )
+
+        return self._params
@@ -0,0 +1,103 @@
+from __future__ import annotations
+import threading
+from typing import Any, Hashable, NamedTuple, Optional
+
+from psycopg.sql import Composed
+
+from .cache import LRUCache
+
+
+class ExecuteInfo(NamedTuple):
+    """Statistics of [JinjaPsycopg.execute][jinja_psycopg.renderer.JinjaPsycopg.execute]"""
+
+    executions: int
+    """Number of executed queries"""
+    query_hits: int
+    """Executions that reused the query bytes of an earlier one with the same shape"""
+    query_misses: int
+    """Executions that had to convert the query to bytes"""
+    prepare_requests: int
+    """Executions that passed `prepare=True` to psycopg.
+    psycopg prepares the statement on the first of them for every connection
+    and reuses it on the following ones, unless its own cache of prepared statements
+    has evicted it"""
+    shapes: int
+    """Number of distinct queries in the cache"""
+
+
+class _Shape:
+    __slots__ = ("query", "executions")
+
+    def __init__(self, query: bytes) -> None:
+        self.query = query
+        self.executions = 0
+
+
+class QueryCache:
+    def __init__(
+        self, maxsize: Optional[int] = 256, prepare_threshold: Optional[int] = 5
+    ) -> None:
+        """Cache of queries rendered with bound parameters, converted to bytes,
+        that counts how often each one is executed
+
+        Args:
+            maxsize: maximum number of distinct queries, `None` for no limit
+            prepare_threshold: number of executions after which a query is prepared,
+                `None` to never prepare queries explicitly
+        """
+        self._queries = LRUCache[tuple[Hashable, str], _Shape](maxsize)
+        self._prepare_threshold = prepare_threshold
+        self._lock = threading.Lock()
+        self._executions = 0
+        self._prepare_requests = 0
+
+    def lookup(
+        self, key: Hashable, query: Composed, connection: Any
+    ) -> tuple[bytes, bool]:
+        """Count an execution of the query
+
+        Args:
+            key: identity of the query, see `_shape_key`
+            query: query with placeholders
+            connection: connection that will run it
+
+        Returns:
+            the query as bytes, and whether it should be prepared
+        """
+        encoding = connection.info.encoding
+        shape = self._queries.get((key, encoding))
+        if shape is None:
+            shape = _Shape(query.as_bytes(connection))
+            self._queries.put((key, encoding), shape)
+
+        threshold = self._prepare_threshold
+        with self._lock:
+            shape.executions += 1
+            prepare = threshold is not None and shape.executions >= threshold
+
+            self._executions += 1
+            if prepare:
+                self._prepare_requests += 1
+
+        return shape.query, prepare
+
+    def info(self) -> ExecuteInfo:
+        """
+        Returns:
+            execution statistics
+        """
+        queries = self._queries.info()
+        return ExecuteInfo(
+            self._executions,
+            queries.hits,
+            queries.misses,
+            self._prepare_requests,
+            queries.currsize,
+        )
+
+    def clear(self) -> None:
+        """Remove all queries and reset the statistics"""
+        self._queries.clear()
+        with self._lock:
+            self._executions = 0
+            self._prepare_requests = 0
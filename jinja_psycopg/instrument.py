@@ -0,0 +1,72 @@
+from __future__ import annotations
+import hashlib
+from typing import Callable, NamedTuple
+
+from psycopg.sql import SQL, Composable, Composed, Literal, Placeholder
+
+
+class RenderEvent(NamedTuple):
+    """Timings and statistics of a single template operation"""
+
+    template_id: str
+    """Template name, or a hash of the source for templates created from strings"""
+    operation: str
+    """`from_string`, `render`, `render_params`, `render_async`, `render_params_async`,
+    `make_module` or `make_module_async`"""
+    timings: dict[str, float]
+    """Duration of each phase in seconds: `parse`, `compile` and `analyze` for `from_string`,
+    `execute` (running the template) and `compose` (building the Composed object) for the rest"""
+    static_args: int
+    """Number of values recorded during compilation"""
+    dynamic_args: int
+    """Number of values recorded during this operation"""
+    output_size: int
+    """Size of the template output in characters, each value counted by the size of its marker"""
+
+
+RenderObserver = Callable[[RenderEvent], None]
+"""
+Callback receiving a [RenderEvent][jinja_psycopg.instrument.RenderEvent] after every operation
+"""
+
+
+def source_id(source: str) -> str:
+    """
+    Args:
+        source: template string
+
+    Returns:
+        short stable hash identifying the template
+    """
+    return hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+
+
+def fingerprint(template_id: str, composed: Composable) -> str:
+    """Identify the shape of a rendered query: its SQL text, identifiers
+    and other SQL objects, but not its literal values or bound parameters
+
+    Args:
+        template_id: template identity, see
+            [SqlTemplate.template_id][jinja_psycopg.renderer.SqlTemplate.template_id]
+        composed: rendered query
+
+    Returns:
+        short hash that is the same for renders differing only in literal values
+    """
+    digest = hashlib.blake2b(template_id.encode(), digest_size=8)
+    _update_fingerprint(digest, composed)
+    return digest.hexdigest()
+
+
+def _update_fingerprint(digest, composable: Composable) -> None:
+    cls = type(composable)
+    if cls is SQL:
+        digest.update(composable.as_string(None).encode())
+    elif cls is Composed:
+        for item in composable:  # type:ignore
+            _update_fingerprint(digest, item)
+    elif cls is Literal or cls is Placeholder:
+        digest.update(b"\x00?")
+    else:
+        digest.update(b"\x00")
+        digest.update(repr(composable).encode())
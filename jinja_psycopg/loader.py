@@ -0,0 +1,45 @@
+from __future__ import annotations
+from typing import Any, Callable, MutableMapping, Optional
+
+from jinja2 import BaseLoader, Environment, Template
+
+from .context import FormatArgsContext
+
+
+class PsycopgLoader(BaseLoader):
+    def __init__(self, loader: BaseLoader, context: FormatArgsContext) -> None:
+        """Wrapper for a jinja loader that compiles templates with recording suspended.
+
+        Constant blocks like `{{ 'text' }}` can then only be evaluated when rendering,
+        so the compiled code doesn't depend on recorded values
+        and can be stored in a [jinja2.BytecodeCache][].
+        Without it, a template first loaded by `{% include %}` in the middle of a render
+        would refer to values recorded by that render
+
+        Args:
+            loader: inner loader
+            context: context whose recording is suspended
+        """
+        self.loader = loader
+        self._context = context
+
+    @property
+    def has_source_access(self) -> bool:  # type:ignore
+        return self.loader.has_source_access
+
+    def get_source(
+        self, environment: Environment, template: str
+    ) -> tuple[str, Optional[str], Optional[Callable[[], bool]]]:
+        return self.loader.get_source(environment, template)
+
+    def list_templates(self) -> list[str]:
+        return self.loader.list_templates()
+
+    def load(
+        self,
+        environment: Environment,
+        name: str,
+        globals: Optional[MutableMapping[str, Any]] = None,
+    ) -> Template:
+        with self._context.suspend():
+            return self.loader.load(environment, name, globals)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import datetime
+import uuid
+from typing import Any, Optional
+
+from psycopg.adapt import AdaptersMap, Transformer
+from psycopg.sql import SQL, Composable, Composed, Identifier, Literal
+
+# Values that can't change after being quoted, and whose equal values are quoted the same,
+# unlike Decimal('1.0') == Decimal('1.00'), 0.0 == -0.0 or datetimes in different timezones
+_CACHEABLE = frozenset(
+    {str, int, bool, type(None), bytes, datetime.date, datetime.timedelta, uuid.UUID}
+)
+
+
+class OfflineContext:
+    def __init__(
+        self,
+        encoding: str = "utf-8",
+        standard_conforming_strings: bool = True,
+        adapters: Optional[AdaptersMap] = None,
+    ) -> None:
+        """Adaptation settings for turning SQL into text without a connection,
+        standing in for the ones psycopg reads from the server
+
+        Args:
+            encoding: client encoding, used by [as_bytes][jinja_psycopg.offline.OfflineContext.as_bytes]
+            standard_conforming_strings: whether the server treats backslashes in
+                `'...'` literals as plain characters (the default since PostgreSQL 9.1).
+                If not, strings containing backslashes are written as `E'...'`
+            adapters: dumpers for literal values, defaults to psycopg's global adapters
+        """
+        self.encoding = encoding
+        self.standard_conforming_strings = standard_conforming_strings
+        self.adapters = adapters
+
+    def as_string(self, composable: Composable) -> str:
+        """Same as [psycopg.sql.Composable.as_string][], but without a connection.
+
+        Within a call, identifiers and immutable literal values are quoted once,
+        no matter how many times they appear
+
+        Args:
+            composable: SQL to convert
+
+        Returns:
+            SQL text
+        """
+        parts: list[str] = []
+        self._write(composable, parts, Transformer(self.adapters), {})
+        return "".join(parts)
+
+    def as_bytes(self, composable: Composable) -> bytes:
+        """
+        Args:
+            composable: SQL to convert
+
+        Returns:
+            SQL text in the context's encoding
+        """
+        return self.as_string(composable).encode(self.encoding)
+
+    def _write(
+        self,
+        obj: Composable,
+        parts: list[str],
+        transformer: Transformer,
+        quoted: dict[Any, str],
+    ) -> None:
+        cls = type(obj)
+        if cls is SQL:
+            parts.append(obj.as_string(None))
+        elif cls is Composed:
+            for item in obj:  # type:ignore
+                self._write(item, parts, transformer, quoted)
+        elif cls is Identifier:
+            # psycopg keeps the composable's contents in `_obj`
+            key = (Identifier, obj._obj)
+            text = quoted.get(key)
+            if text is None:
+                text = quoted[key] = ".".join(
+                    '"' + name.replace('"', '""') + '"' for name in obj._obj
+                )
+            parts.append(text)
+        elif cls is Literal:
+            value = obj._obj
+            if type(value) in _CACHEABLE:
+                key = (type(value), value)
+                text = quoted.get(key)
+                if text is None:
+                    text = quoted[key] = self._quote(value, transformer)
+                parts.append(text)
+            else:
+                parts.append(self._quote(value, transformer))
+        else:
+            parts.append(obj.as_string(None))
+
+    def _quote(self, value: Any, transformer: Transformer) -> str:
+        if type(value) is str and "\x00" not in value:
+            value = value.replace("'", "''")
+            if self.standard_conforming_strings or "\\" not in value:
+                return f"'{value}'"
+            return " E'" + value.replace("\\", "\\\\") + "'"
+
+        # Without a connection, psycopg's dumpers produce UTF-8.
+        # Literal reuses the transformer, and its dumpers, where psycopg supports it
+        return Literal(value).as_bytes(transformer).decode()
+
+
+DEFAULT_CONTEXT = OfflineContext()
+"""Context used when none is given: UTF-8 with standard conforming strings"""
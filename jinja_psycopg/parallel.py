@@ -0,0 +1,95 @@
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+from psycopg.sql import Composed
+
+from .renderer import JinjaPsycopg, SqlTemplate
+
+
+class TemplateSource(NamedTuple):
+    """Picklable recipe for building a template inside a worker process,
+    since compiled templates can't be sent between processes"""
+
+    renderer_factory: Callable[[], JinjaPsycopg]
+    """Picklable callable creating the renderer, such as a JinjaPsycopg subclass"""
+    source: Optional[str] = None
+    """Template string, see [from_string][jinja_psycopg.renderer.JinjaPsycopg.from_string]"""
+    name: Optional[str] = None
+    """Template name, see [get_template][jinja_psycopg.renderer.JinjaPsycopg.get_template]"""
+    dedent: bool = True
+    strip: bool = True
+
+    def build(self) -> SqlTemplate:
+        """
+        Returns:
+            compiled template
+        """
+        renderer = self.renderer_factory()
+        if self.source is not None:
+            return renderer.from_string(self.source, self.dedent, self.strip)
+        if self.name is not None:
+            return renderer.get_template(self.name)
+
+        raise ValueError("TemplateSource needs either a source or a name")
+
+
+# Templates built by this worker process
+_WORKER_TEMPLATES: dict[TemplateSource, SqlTemplate] = {}
+
+
+def _render_in_worker(source: TemplateSource, params: Mapping[str, Any]) -> Composed:
+    template = _WORKER_TEMPLATES.get(source)
+    if template is None:
+        template = _WORKER_TEMPLATES[source] = source.build()
+
+    return template.render(params)
+
+
+def render_parallel(
+    template: Union[SqlTemplate, TemplateSource],
+    params_iter: Iterable[Mapping[str, Any]],
+    executor: Executor,
+    chunksize: int = 16,
+) -> Iterator[Composed]:
+    """Render a template for every set of arguments on an executor
+
+    A [SqlTemplate][jinja_psycopg.renderer.SqlTemplate] can be shared between threads,
+    so it can be rendered on a [ThreadPoolExecutor][concurrent.futures.ThreadPoolExecutor].
+    For a [ProcessPoolExecutor][concurrent.futures.ProcessPoolExecutor], which avoids
+    the GIL for CPU-bound rendering, pass a
+    [TemplateSource][jinja_psycopg.parallel.TemplateSource]:
+    each worker process compiles it once and reuses it
+
+    Args:
+        template: template, or a recipe for building it in worker processes
+        params_iter: template arguments
+        executor: executor to render on
+        chunksize: number of renders sent to a worker process at once
+
+    Returns:
+        rendered SQL, in the same order as `params_iter`
+    """
+    if isinstance(template, TemplateSource):
+        if isinstance(executor, ProcessPoolExecutor):
+            return executor.map(
+                partial(_render_in_worker, template), params_iter, chunksize=chunksize
+            )
+
+        template = template.build()
+    elif isinstance(executor, ProcessPoolExecutor):
+        raise TypeError(
+            "Compiled templates can't be sent to other processes, pass a TemplateSource"
+        )
+
+    return executor.map(template.render, params_iter)
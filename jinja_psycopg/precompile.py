@@ -0,0 +1,111 @@
+"""Warm a [jinja2.FileSystemBytecodeCache][] with compiled templates at deploy time,
+so that workers start without compiling them.
+
+Usage: `python -m jinja_psycopg.precompile TEMPLATE_DIR CACHE_DIR [--workers N]`
+"""
+
+from __future__ import annotations
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from .renderer import JinjaPsycopg
+
+DEFAULT_EXTENSIONS = (".sql", ".j2", ".jinja", ".jinja2")
+
+
+def make_environment(directory: str, cache_directory: str) -> Environment:
+    """
+    Args:
+        directory: template directory
+        cache_directory: bytecode cache directory
+
+    Returns:
+        environment loading templates from `directory`
+            and caching their bytecode in `cache_directory`.
+            The runtime environment must use the same paths for the cache to be hit
+    """
+    return Environment(
+        loader=FileSystemLoader(directory),
+        bytecode_cache=FileSystemBytecodeCache(cache_directory),
+    )
+
+
+def _compile_templates(
+    renderer_class: Callable[[Environment], JinjaPsycopg],
+    directory: str,
+    cache_directory: str,
+    names: list[str],
+) -> list[str]:
+    renderer = renderer_class(make_environment(directory, cache_directory))
+    for name in names:
+        renderer.get_template(name)
+
+    return names
+
+
+def precompile(
+    directory: str,
+    cache_directory: str,
+    workers: Optional[int] = None,
+    extensions: Optional[Iterable[str]] = DEFAULT_EXTENSIONS,
+    renderer_class: Callable[[Environment], JinjaPsycopg] = JinjaPsycopg,
+) -> list[str]:
+    """Compile all templates in a directory in parallel processes,
+    storing their bytecode in `cache_directory`
+
+    Args:
+        directory: template directory
+        cache_directory: bytecode cache directory
+        workers: number of processes, defaults to the number of CPUs
+        extensions: file extensions of the templates, `None` to compile all files
+        renderer_class: JinjaPsycopg subclass used at runtime.
+            Must be importable by the worker processes
+
+    Returns:
+        names of the compiled templates
+    """
+    loader = FileSystemLoader(directory)
+    extensions = tuple(extensions) if extensions is not None else None
+    names = [
+        name
+        for name in loader.list_templates()
+        if extensions is None or name.endswith(extensions)
+    ]
+    if not names:
+        return []
+
+    os.makedirs(cache_directory, exist_ok=True)
+
+    workers = min(workers or os.cpu_count() or 1, len(names))
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(
+                _compile_templates,
+                renderer_class,
+                directory,
+                cache_directory,
+                names[i::workers],
+            )
+            for i in range(workers)
+        ]
+
+        return [name for future in futures for name in future.result()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("directory", help="template directory")
+    parser.add_argument("cache_directory", help="bytecode cache directory")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    args = parser.parse_args()
+
+    names = precompile(args.directory, args.cache_directory, args.workers)
+    print(f"Compiled {len(names)} templates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import os
+import threading
+import weakref
+from typing import Callable, Iterable, Optional
+
+from jinja2 import TemplateNotFound, meta
+
+from .renderer import JinjaPsycopg, SqlTemplate
+
+try:
+    import inotify_simple
+except ImportError:  # pragma: no cover
+    inotify_simple = None
+
+ReloadCallback = Callable[[set[str]], None]
+"""
+Callback receiving the names of the reloaded templates and their dependents
+"""
+
+
+class TemplateRegistry:
+    def __init__(self, renderer: JinjaPsycopg) -> None:
+        """Registry of loaded templates that tracks which files they come from
+        and which templates they `{% import %}`, `{% include %}` or `{% extends %}`.
+
+        Lookups are plain dictionary reads: jinja's `auto_reload` is turned off,
+        and changed files are reloaded by [poll][jinja_psycopg.registry.TemplateRegistry.poll]
+        or by the background watcher started with [watch][jinja_psycopg.registry.TemplateRegistry.watch]
+
+        Args:
+            renderer: renderer whose environment has a loader
+        """
+        if renderer._env.loader is None:
+            raise ValueError("TemplateRegistry requires an environment with a loader")
+
+        self._renderer = renderer
+        self._env = renderer._env
+        self._env.auto_reload = False
+
+        self._templates: dict[str, SqlTemplate] = {}
+        self._filenames: dict[str, str] = {}
+        self._mtimes: dict[str, int] = {}
+        self._dependencies: dict[str, set[str]] = {}
+        self._dependents: dict[str, set[str]] = {}
+
+        self._lock = threading.RLock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def get(self, name: str) -> SqlTemplate:
+        """
+        Args:
+            name: template name
+
+        Returns:
+            loaded template, loading it and its dependencies on first use
+        """
+        template = self._templates.get(name)
+        if template is None:
+            with self._lock:
+                self._load(name)
+                template = self._templates[name]
+
+        return template
+
+    def dependents(self, name: str) -> set[str]:
+        """
+        Args:
+            name: template name
+
+        Returns:
+            names of the templates that depend on this one, directly or transitively
+        """
+        with self._lock:
+            found: set[str] = set()
+            pending = [name]
+            while pending:
+                for dependent in self._dependents.get(pending.pop(), ()):
+                    if dependent not in found:
+                        found.add(dependent)
+                        pending.append(dependent)
+
+            return found
+
+    def _load(self, name: str) -> None:
+        if name in self._templates:
+            return
+
+        source, filename, _ = self._env.loader.get_source(
+            self._env, name
+        )  # type:ignore
+        dependencies = {
+            ref
+            for ref in meta.find_referenced_templates(self._env.parse(source))
+            if ref is not None
+        }
+
+        self._templates[name] = self._renderer.get_template(name)
+        self._set_dependencies(name, dependencies)
+        if filename is not None:
+            self._filenames[name] = filename
+            self._mtimes[name] = _mtime(filename)
+
+        for dependency in dependencies:
+            try:
+                self._load(dependency)
+            except TemplateNotFound:
+                # Could be `{% include ... ignore missing %}`, jinja will complain if it isn't
+                pass
+
+    def _set_dependencies(self, name: str, dependencies: set[str]) -> None:
+        for dependency in self._dependencies.pop(name, ()):
+            self._dependents[dependency].discard(name)
+
+        self._dependencies[name] = dependencies
+        for dependency in dependencies:
+            self._dependents.setdefault(dependency, set()).add(name)
+
+    def _unload(self, name: str) -> None:
+        self._templates.pop(name, None)
+        self._filenames.pop(name, None)
+        self._mtimes.pop(name, None)
+        self._set_dependencies(name, set())
+        del self._dependencies[name]
+
+        if self._env.cache is not None:
+            try:
+                del self._env.cache[(weakref.ref(self._env.loader), name)]
+            except KeyError:
+                pass
+
+    def reload(self, names: Iterable[str]) -> set[str]:
+        """Recompile the given templates.
+        Templates that depend on them aren't recompiled, since jinja resolves
+        imports, includes and base templates when rendering
+
+        Args:
+            names: names of the changed templates
+
+        Returns:
+            names of the reloaded templates and their dependents
+        """
+        with self._lock:
+            affected: set[str] = set()
+            for name in names:
+                if name not in self._templates:
+                    continue
+
+                affected.add(name)
+                affected |= self.dependents(name)
+
+                self._unload(name)
+                try:
+                    self._load(name)
+                except TemplateNotFound:
+                    pass
+
+            return affected
+
+    def poll(self) -> set[str]:
+        """Reload templates whose files have changed since they were loaded
+
+        Returns:
+            names of the reloaded templates and their dependents
+        """
+        with self._lock:
+            changed = [
+                name
+                for name, filename in self._filenames.items()
+                if _mtime(filename) != self._mtimes.get(name)
+            ]
+
+        return self.reload(changed) if changed else set()
+
+    def watch(
+        self, interval: float = 1.0, on_reload: Optional[ReloadCallback] = None
+    ) -> None:
+        """Start a daemon thread reloading templates as their files change.
+        Uses inotify if [inotify_simple](https://pypi.org/project/inotify_simple/)
+        is installed, otherwise polls the files every `interval` seconds
+
+        Args:
+            interval: polling interval in seconds
+            on_reload: called with the names of the reloaded templates and their dependents
+        """
+        if self._watcher is not None:
+            raise RuntimeError("TemplateRegistry is already watching")
+
+        target = self._watch_inotify if inotify_simple is not None else self._watch_poll
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=target, args=(interval, on_reload), daemon=True
+        )
+        self._watcher.start()
+
+    def stop(self) -> None:
+        """Stop the watcher thread"""
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_poll(self, interval: float, on_reload: Optional[ReloadCallback]):
+        while not self._stop.wait(interval):
+            affected = self.poll()
+            if affected and on_reload is not None:
+                on_reload(affected)
+
+    def _watch_inotify(self, interval: float, on_reload: Optional[ReloadCallback]):
+        flags = inotify_simple.flags  # type:ignore
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+
+        with inotify_simple.INotify() as inotify:  # type:ignore
+            directories: dict[int, str] = {}
+
+            while not self._stop.is_set():
+                # Editors often replace files instead of writing them,
+                # so the directories are watched rather than the files
+                with self._lock:
+                    paths = {os.path.dirname(f) for f in self._filenames.values()}
+                for path in paths - set(directories.values()):
+                    directories[inotify.add_watch(path, mask)] = path
+
+                events = inotify.read(timeout=int(interval * 1000))
+                changed_paths = {
+                    os.path.join(directories[event.wd], event.name)
+                    for event in events
+                    if event.wd in directories
+                }
+                if not changed_paths:
+                    continue
+
+                with self._lock:
+                    changed = [
+                        name
+                        for name, filename in self._filenames.items()
+                        if filename in changed_paths
+                    ]
+
+                affected = self.reload(changed)
+                if affected and on_reload is not None:
+                    on_reload(affected)
+
+
+def _mtime(filename: str) -> int:
+    try:
+        return os.stat(filename).st_mtime_ns
+    except OSError:
+        return -1
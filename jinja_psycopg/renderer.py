@@ -1,39 +1,310 @@
 from __future__ import annotations
 import textwrap
-from typing import Any, Mapping, Optional, Union
+from contextvars import Context, copy_context
+from functools import lru_cache
+from itertools import chain, islice
+from time import perf_counter
+from weakref import WeakKeyDictionary
+from typing import (
+    Any,
+    AsyncIterable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    TYPE_CHECKING,
+    TypeVar,
+    Union,
+)
 
 from jinja2 import Environment, Template
 from jinja2.environment import TemplateModule
-from psycopg.sql import SQL, Composed
+from psycopg import AsyncConnection, AsyncCursor, Connection, Cursor
+from psycopg.abc import AdaptContext
+from psycopg.sql import SQL, Composable, Composed, Identifier, Literal, Placeholder
 
+from .cache import CacheInfo, LRUCache, TTLCache
+from .execute import ExecuteInfo, QueryCache
 from .extension import PsycopgExtension
-from .context import FormatArgsContext
-from .sql import IntoSql, sql_filter, sql_join_filter
+from .loader import PsycopgLoader
+from .offline import _CACHEABLE, DEFAULT_CONTEXT, OfflineContext
+from .instrument import RenderEvent, RenderObserver, fingerprint, source_id
+from .context import BoundParam, FormatArgsContext, ParamStyle
+from .script import StatementResult, execute_script, split_statements
+from .shape import StaticShape
+from .sql import get_sql_adapter, into_sql, sql_filter, sql_join_filter
 
-CONTEXT = FormatArgsContext("format_args")
+if TYPE_CHECKING:
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+# Delimits the keys of recorded values in the template output.
+# NUL can't appear in a PostgreSQL query, so it never clashes with the SQL text
+MARKER = "\x00"
+
+CONTEXT = FormatArgsContext("format_args", delimiter=MARKER)
 _NO_VALUE = object()
+T = TypeVar("T")
+
+# Key prefixes of the values recorded while compiling, while rendering
+# and while calling module macros.
+# Keys are the prefix followed by the value's index, like `\x00d17\x00`
+_STATIC = "s"
+_DYNAMIC = "d"
+_CALL = "c"
+
+# Composables are immutable, so every positional parameter can share one placeholder
+_POSITIONAL = Placeholder()
+
+
+_SQL = "sql"
+_COMPOSABLE = "composable"
+_LITERAL = "literal"
+
+
+@lru_cache(maxsize=None)
+def _value_kind(cls: type) -> str:
+    if issubclass(cls, SQL):
+        return _SQL
+    if issubclass(cls, Composable):
+        return _COMPOSABLE
+    return _LITERAL
 
 
 def psycopg_filter(value: Any) -> str:
-    """Jinja filter that saves the value inside a dictionary in ContextVar
-        and returns a psycopg format placeholder
+    """Jinja filter that saves the value inside a list in ContextVar
+        and returns a marker that is later replaced with the value
+
+    When rendering with bound parameters, literal values (anything that isn't
+    a [psycopg.sql.Composable][]) are saved as parameters
+    and replaced with a [psycopg.sql.Placeholder][]
 
     Args:
         value: value piped into the filter
 
     Returns:
-        psycopg format placeholder such as `{key}`
+        marker such as `\\x00d17\\x00`
     """
-    if isinstance(value, IntoSql):
-        value = value.__sql__()
+    adapter = get_sql_adapter(type(value))
+    if adapter is not None:
+        value = adapter(value)
 
-    if isinstance(value, SQL):
-        # No need to pass SQL to psycopg's formatter,
-        # since it's included as is
+    kind = _value_kind(type(value))
+    if kind is _SQL:
+        # No need to record SQL, since it's included as is
         return value.as_string(None)
 
-    key = CONTEXT.save_value(value)
-    return f"{{{key}}}"
+    if kind is _LITERAL:
+        value = CONTEXT.bind_param(value)
+
+    return CONTEXT.save_value(value)
+
+
+def anyarray_filter(value: Iterable[Any], type: Optional[str] = None) -> SQL:
+    """Jinja filter that turns a list into `= ANY(...)`, passing the whole list as a single value,
+    so the query text doesn't depend on the length of the list
+
+    Args:
+        value: list of values
+        type: SQL type of the elements, such as `int8`, used to cast the array
+
+    Returns:
+        SQL such as `= ANY(\\x00d17\\x00)` or `= ANY(\\x00d17\\x00::int8[])`
+    """
+    marker = psycopg_filter(list(value))
+    if type is not None:
+        return SQL(f"= ANY({marker}::{type}[])")
+    return SQL(f"= ANY({marker})")
+
+
+def _sql_value(value: Any) -> Composable:
+    # Same conversion as psycopg_filter, but returns the SQL instead of recording it
+    value = into_sql(value)
+    if _value_kind(type(value)) is _LITERAL:
+        value = CONTEXT.bind_param(value)
+        if not isinstance(value, Composable):
+            return Literal(value)
+
+    return value
+
+
+_ROW_START = SQL("(")
+_ROW_END = SQL(")")
+_CELL_DELIMITER = SQL(", ")
+
+
+def sql_values_filter(
+    rows: Iterable[Any], columns: Optional[Iterable[str]] = None
+) -> Composed:
+    """Jinja filter that renders rows as the body of a `VALUES` list, like `(1, 'a'), (2, 'b')`,
+    in a single pass. Literal values are bound as parameters when rendering with them
+
+    Args:
+        rows: sequences of values, or mappings if `columns` is given
+        columns: keys of the values in every row, in order
+
+    Returns:
+        the rows as SQL
+    """
+    if columns is not None:
+        columns = list(columns)
+        rows = ([row[column] for column in columns] for row in rows)
+
+    return sql_join_filter(
+        (
+            Composed([_ROW_START, _CELL_DELIMITER.join(map(_sql_value, row)), _ROW_END])
+            for row in rows
+        ),
+        ", ",
+    )
+
+
+def compose(
+    chunks: Iterable[str],
+    args: Mapping[str, Sequence[Any]],
+    params: Optional[list[Any]] = None,
+    escaped: bool = False,
+) -> Composed:
+    """Build a [psycopg.sql.Composed][] from the template output in a single pass,
+    replacing markers with the recorded values.
+    Values that are themselves [psycopg.sql.Composed][], like the output of `sqljoin`,
+    are flattened into the result, and adjacent SQL is merged,
+    so the result is a flat sequence of SQL text and values.
+
+    '%' in the template output, which includes the output of the `sql` filter,
+    is replaced with '%%', so that psycopg doesn't mistake it for a placeholder.
+    Every piece of text is escaped exactly once, here, since text captured by macros,
+    blocks, includes and `{% set %}` blocks can go through the `sql` filter again.
+    Output that can't be captured, like that of a [StaticShape][jinja_psycopg.shape.StaticShape],
+    can be escaped beforehand instead
+
+    Args:
+        chunks: template output, as yielded by [jinja2.Template.generate][]
+        args: recorded values, by key prefix
+        params: list receiving the parameters of [BoundParam][jinja_psycopg.context.BoundParam]s,
+            in the order their placeholders appear in the output
+        escaped: whether '%' in the chunks is escaped already
+
+    Returns:
+        output sql
+    """
+    return next(compose_stream(chunks, args, params=params, escaped=escaped))
+
+
+def compose_stream(
+    chunks: Iterable[str],
+    args: Mapping[str, Sequence[Any]],
+    buffer_size: Optional[int] = None,
+    params: Optional[list[Any]] = None,
+    escaped: bool = False,
+) -> Iterator[Composed]:
+    """Same as [compose][jinja_psycopg.renderer.compose],
+    but yields a new [psycopg.sql.Composed][] every `buffer_size` characters of output
+
+    Args:
+        chunks: template output, as yielded by [jinja2.Template.generate][]
+        args: recorded values, by key prefix
+        buffer_size: approximate size of each fragment,
+            `None` to yield a single fragment with the whole output
+        params: list receiving the parameters of [BoundParam][jinja_psycopg.context.BoundParam]s
+        escaped: whether '%' in the chunks is escaped already
+
+    Yields:
+        output sql fragments
+    """
+    sequence = []
+    text: list[str] = []
+    buffered = 0
+
+    for chunk in chunks:
+        if not escaped:
+            chunk = chunk.replace("%", "%%")
+
+        if MARKER not in chunk:
+            if chunk:
+                text.append(chunk)
+                buffered += len(chunk)
+        else:
+            parts = chunk.split(MARKER)
+            for i, part in enumerate(parts):
+                if i % 2 == 0:
+                    if part:
+                        text.append(part)
+                        buffered += len(part)
+                else:
+                    value = args[part[0]][int(part[1:])]
+                    buffered += 1
+
+                    cls = type(value)
+                    if cls is Composed:
+                        _splice(value, sequence, text, params)
+                    else:
+                        if cls is BoundParam:
+                            params.append(value.value)  # type:ignore
+                            value = _POSITIONAL
+                        if text:
+                            sequence.append(SQL("".join(text)))
+                            text.clear()
+                        sequence.append(value)
+
+        if buffer_size is not None and buffered >= buffer_size:
+            if text:
+                sequence.append(SQL("".join(text)))
+                text.clear()
+
+            yield Composed(sequence)
+            sequence = []
+            buffered = 0
+
+    if text:
+        sequence.append(SQL("".join(text)))
+
+    if sequence or buffer_size is None:
+        yield Composed(sequence)
+
+
+def _splice(
+    composed: Composed,
+    sequence: list[Composable],
+    text: list[str],
+    params: Optional[list[Any]],
+) -> None:
+    # Add the items of a Composed value, such as the output of sqljoin, to the top-level sequence,
+    # merging its SQL with the adjacent text. Its SQL is merged as is, without escaping,
+    # same as psycopg does with the SQL inside a Composed
+    held = None  # SQL item that isn't adjacent to any text yet, reused if it stays that way
+    for item in composed:
+        cls = type(item)
+        if cls is SQL:
+            if held is not None:
+                text.append(held.as_string(None))
+                text.append(item.as_string(None))
+                held = None
+            elif text:
+                text.append(item.as_string(None))
+            else:
+                held = item
+        elif cls is Composed:
+            if held is not None:
+                text.append(held.as_string(None))
+                held = None
+            _splice(item, sequence, text, params)  # type:ignore
+        else:
+            if cls is BoundParam:
+                params.append(item.value)  # type:ignore
+                item = _POSITIONAL
+            if held is not None:
+                sequence.append(held)
+                held = None
+            elif text:
+                sequence.append(SQL("".join(text)))
+                text.clear()
+            sequence.append(item)
+
+    if held is not None:
+        text.append(held.as_string(None))
 
 
 def escape_percents(composed: Composed) -> Composed:
@@ -57,30 +328,472 @@ def escape_percents(composed: Composed) -> Composed:
     return Composed(new_sequence)
 
 
+def _unescape_percents(composed: Composed) -> Composed:
+    # For statements sent without parameters, which psycopg passes to the server as is,
+    # such as COPY, whose parameters psycopg 3.0 doesn't support
+    return Composed(
+        [
+            SQL(item.as_string(None).replace("%%", "%")) if type(item) is SQL else item
+            for item in composed
+        ]
+    )
+
+
+_SHAPE_TYPES = (SQL, Identifier)
+
+
+def _shape_key(composed: Composed) -> Hashable:
+    # Composables compare by value, but aren't hashable.
+    # psycopg keeps the strings of SQL and Identifier in `_obj`,
+    # and placeholders of bound parameters are all the same object
+    return tuple(
+        [
+            (
+                None
+                if item is _POSITIONAL
+                else (
+                    item._obj
+                    if type(item) in _SHAPE_TYPES
+                    else (type(item), repr(item))
+                )
+            )
+            for item in composed._obj
+        ]
+    )
+
+
+_UNCACHEABLE = object()
+
+
+def _value_key(value: Any) -> Any:
+    cls = type(value)
+    if cls in _CACHEABLE:
+        return (cls, value)
+    if cls is SQL or cls is Identifier:
+        # Immutable, but compare by value without being hashable.
+        # psycopg keeps their strings in `_obj`
+        return (cls, value._obj)
+    if cls is Placeholder:
+        return (cls, repr(value))
+    if cls is tuple:
+        keys = tuple(map(_value_key, value))
+        return _UNCACHEABLE if _UNCACHEABLE in keys else (cls, keys)
+
+    return _UNCACHEABLE
+
+
+def _params_key(args: tuple, kwargs: dict[str, Any]) -> Optional[Hashable]:
+    # Key for template arguments that can't change after rendering, `None` for any others
+    if not args:
+        params = kwargs
+    elif len(args) == 1 and not kwargs and type(args[0]) is dict:
+        params = args[0]
+    else:
+        params = dict(*args, **kwargs)
+
+    items = []
+    for name, value in params.items():
+        key = _value_key(value)
+        if key is _UNCACHEABLE:
+            return None
+        items.append((name, key))
+
+    return frozenset(items)
+
+
+def _output_size(composed: Composed) -> int:
+    # Same measure as RenderEvent.output_size
+    return sum(
+        len(item.as_string(None)) if type(item) is SQL else 1 for item in composed
+    )
+
+
+def _run_in_context(context: Context, iterator: Iterator[T]) -> Iterator[T]:
+    # Advance the iterator inside the given context, so that the ContextVars it sets
+    # don't leak into the consumer's context between iterations
+    while True:
+        try:
+            item = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield item
+
+
 class SqlTemplate:
-    def __init__(self, template: Template, static_args: dict[str, Any]) -> None:
+    generate_buffer_size = 65536
+    """Approximate size in characters of the fragments yielded by
+    [generate][jinja_psycopg.renderer.SqlTemplate.generate]"""
+
+    def __init__(
+        self,
+        template: Template,
+        static_args: list[Any],
+        shape: Optional[StaticShape] = None,
+        template_id: Optional[str] = None,
+        observer: Optional[RenderObserver] = None,
+    ) -> None:
         """Wrapper for [jinja2.Template][] that stores static format arguments
             such as `{{ 'text' }}`
 
         Args:
             template: inner Template
             static_args: args recurded during template creation
+            shape: skeleton of the template, if its output structure doesn't depend on the parameters
+            template_id: identity reported to the observer, defaults to the template name
+            observer: callback receiving the timings of every render
         """
 
         self._template = template
         self._static_args = static_args
+        self._shape = shape
+        self._template_id = template_id
+        self.observer = observer
+        self.render_cache: Optional[TTLCache[Hashable, Composed]] = None
+
+    @property
+    def template_id(self) -> str:
+        """Template identity used in [RenderEvent][jinja_psycopg.instrument.RenderEvent]s"""
+        return self._template_id or self._template.name or ""
+
+    def _notify(
+        self,
+        operation: str,
+        start: float,
+        executed: float,
+        dynamic_args: list[Any],
+        chunks: list[str],
+    ):
+        self.observer(  # type:ignore
+            RenderEvent(
+                self.template_id,
+                operation,
+                {"execute": executed - start, "compose": perf_counter() - executed},
+                len(self._static_args),
+                len(dynamic_args),
+                sum(map(len, chunks)),
+            )
+        )
+
+    def _args(self, dynamic_args: list[Any]) -> dict[str, list[Any]]:
+        return {_STATIC: self._static_args, _DYNAMIC: dynamic_args}
+
+    @property
+    def is_static_shape(self) -> bool:
+        """Whether rendering reuses a precomputed skeleton of the template
+        instead of running jinja, which is the case for templates
+        without control flow, containing only variables like `{{ table }}` or `{{ user.id }}`
+        """
+        return self._shape is not None
+
+    def _generate(self, args: tuple, kwargs: dict[str, Any]) -> tuple[list[str], bool]:
+        # Returns the template output, and whether '%' in it is escaped already
+        if self._shape is not None:
+            mark = CONTEXT.mark()
+            chunks = self._shape.generate(dict(*args, **kwargs), self._template.globals)
+            if chunks is not None:
+                return chunks, True
+
+            # Filters like anyarray may have recorded values and bound parameters
+            # before the fallback, which jinja would record again
+            CONTEXT.truncate(mark)
+
+        return list(self._template.generate(*args, **kwargs)), False
 
     def render(self, *args, **kwargs) -> Composed:
         """
-        Same as [jinja2.Template.render][], but returns a [psycopg.sql.Composed][] object
+        Same as [jinja2.Template.render][], but returns a [psycopg.sql.Composed][] object.
+
+        With a [render cache][jinja_psycopg.renderer.SqlTemplate.enable_render_cache],
+        renders with the same arguments return the same object
         """
-        recorder = CONTEXT.recorder("dynamic")
+        cache = self.render_cache
+        if cache is not None:
+            key = _params_key(args, kwargs)
+            if key is not None:
+                composed = cache.get(key)
+                if composed is None:
+                    composed = self._render("render", None, args, kwargs)[0]
+                    cache.put(key, composed)
+                return composed
+
+        return self._render("render", None, args, kwargs)[0]
+
+    def enable_render_cache(
+        self,
+        maxsize: Optional[int] = 128,
+        max_output_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> TTLCache[Hashable, Composed]:
+        """Cache the output of [render][jinja_psycopg.renderer.SqlTemplate.render] by its arguments.
+
+        Only renders whose arguments can't change are cached: strings, numbers, `None`,
+        bytes, dates, UUIDs, `SQL`, `Identifier`, `Placeholder` and tuples of them.
+        Renders with any other argument, such as a list or a dict, run as usual.
+        The template's globals, and any state they depend on, are expected not to change
+
+        Args:
+            maxsize: maximum number of cached renders, `None` for no limit
+            max_output_size: maximum total size of the cached output in characters,
+                `None` for no limit
+            ttl: seconds after which a cached render expires, `None` to keep it until evicted
+
+        Returns:
+            the cache, for its statistics
+        """
+        self.render_cache = TTLCache(maxsize, max_output_size, ttl, _output_size)
+        return self.render_cache
+
+    def render_script(self, *args, **kwargs) -> list[Composed]:
+        """
+        Same as [render][jinja_psycopg.renderer.SqlTemplate.render], but splits the output
+        into separate statements, see [split_statements][jinja_psycopg.script.split_statements].
+
+        The statements are split after rendering, in one more pass over the rendered items.
+        Only the SQL text between the recorded values is scanned, once
+
+        Returns:
+            rendered statements
+        """
+        return split_statements(self.render(*args, **kwargs))
+
+    def render_with_fingerprint(self, *args, **kwargs) -> tuple[Composed, str]:
+        """
+        Same as [render][jinja_psycopg.renderer.SqlTemplate.render],
+        but also returns the fingerprint of the query's shape,
+        see [fingerprint][jinja_psycopg.instrument.fingerprint]
+
+        Returns:
+            rendered SQL and its fingerprint
+        """
+        composed = self.render(*args, **kwargs)
+        return composed, fingerprint(self.template_id, composed)
+
+    def _render(
+        self,
+        operation: str,
+        param_style: Optional[ParamStyle],
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> tuple[Composed, Any]:
+        observer = self.observer
+        if observer is not None:
+            start = perf_counter()
+
+        recorder = CONTEXT.recorder(_DYNAMIC, param_style)
         with recorder:
-            sql = SQL(self._template.render(*args, **kwargs))
+            chunks, escaped = self._generate(args, kwargs)
         dynamic_args = recorder.unwrap()
 
-        composed = sql.format(**self._static_args, **dynamic_args)
-        return escape_percents(composed)
+        if observer is not None:
+            executed = perf_counter()
+
+        params: Any = [] if param_style == "positional" else None
+        composed = compose(chunks, self._args(dynamic_args), params, escaped)
+        if param_style == "named":
+            params = recorder.unwrap_params()
+
+        if observer is not None:
+            self._notify(operation, start, executed, dynamic_args, chunks)
+
+        return composed, params
+
+    def generate(self, *args, **kwargs) -> Iterator[Composed]:
+        """
+        Same as [jinja2.Template.generate][], but yields [psycopg.sql.Composed][] fragments
+        of approximately [generate_buffer_size][jinja_psycopg.renderer.SqlTemplate.generate_buffer_size]
+        characters as the template runs, so the whole statement is never held in memory.
+
+        The recorded values are kept until the generator finishes,
+        since text captured by `{% set %}` blocks or macros can output a value more than once
+        """
+        context = copy_context()
+        recorder = CONTEXT.recorder(_DYNAMIC)
+        format_args = context.run(recorder.__enter__)
+
+        try:
+            chunks = _run_in_context(context, self._template.generate(*args, **kwargs))
+            yield from compose_stream(
+                chunks,
+                self._args(format_args.values),
+                self.generate_buffer_size,
+            )
+        finally:
+            context.run(recorder.__exit__, None, None, None)
+
+    async def render_async(self, *args, **kwargs) -> Composed:
+        """
+        Same as [jinja2.Template.render_async][], but returns a [psycopg.sql.Composed][] object.
+        Requires an environment with `enable_async=True`.
+
+        Values are recorded in the current task's context,
+        so concurrent renders on the same event loop don't interfere with each other
+        """
+        return (await self._render_async("render_async", None, args, kwargs))[0]
+
+    async def render_params_async(self, *args, **kwargs) -> tuple[Composed, list[Any]]:
+        """
+        Async version of [render_params][jinja_psycopg.renderer.SqlTemplate.render_params],
+        requires an environment with `enable_async=True`
+
+        Returns:
+            query with `%s` placeholders and the list of parameters
+        """
+        return await self._render_async(
+            "render_params_async", "positional", args, kwargs
+        )
+
+    async def _render_async(
+        self,
+        operation: str,
+        param_style: Optional[ParamStyle],
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> tuple[Composed, Any]:
+        observer = self.observer
+        if observer is not None:
+            start = perf_counter()
+
+        recorder = CONTEXT.recorder(_DYNAMIC, param_style)
+        with recorder:
+            chunks = [
+                chunk async for chunk in self._template.generate_async(*args, **kwargs)
+            ]
+        dynamic_args = recorder.unwrap()
+
+        if observer is not None:
+            executed = perf_counter()
+
+        params: Any = [] if param_style == "positional" else None
+        composed = compose(chunks, self._args(dynamic_args), params)
+        if param_style == "named":
+            params = recorder.unwrap_params()
+
+        if observer is not None:
+            self._notify(operation, start, executed, dynamic_args, chunks)
+
+        return composed, params
+
+    def render_params(self, *args, **kwargs) -> tuple[Composed, list[Any]]:
+        """
+        Same as [render][jinja_psycopg.renderer.SqlTemplate.render],
+        but literal values are passed as bound parameters
+        instead of being formatted into the query.
+        Identifiers, SQL and other [psycopg.sql.Composable][] objects are still inlined
+
+        Returns:
+            query with `%s` placeholders and the list of parameters
+        """
+        return self._render("render_params", "positional", args, kwargs)
+
+    def render_named_params(self, *args, **kwargs) -> tuple[Composed, dict[str, Any]]:
+        """
+        Same as [render_params][jinja_psycopg.renderer.SqlTemplate.render_params],
+        but uses named placeholders
+
+        Returns:
+            query with `%(p0)s`, `%(p1)s`, ... placeholders and the dictionary of parameters
+        """
+        return self._render("render_params", "named", args, kwargs)
+
+    def render_many(
+        self, params_seq: Iterable[Mapping[str, Any]]
+    ) -> list[tuple[Composed, list[list[Any]]]]:
+        """Render the template with bound parameters for every set of arguments,
+        grouping together the ones that produce the same query
+
+        Args:
+            params_seq: template arguments
+
+        Returns:
+            list of distinct queries, each with its rows of parameters,
+                suitable for [psycopg.Cursor.executemany][]
+        """
+        groups: dict[Hashable, tuple[Composed, list[list[Any]]]] = {}
+
+        for params in params_seq:
+            query, bound = self.render_params(params)
+            key = _shape_key(query)
+
+            group = groups.get(key)
+            if group is None:
+                groups[key] = (query, [bound])
+            else:
+                group[1].append(bound)
+
+        return list(groups.values())
+
+    def render_batches(
+        self,
+        rows: Iterable[Any],
+        params: Mapping[str, Any] = {},
+        rows_param: str = "rows",
+        batch_size: Optional[int] = None,
+        max_params: int = 65535,
+    ) -> Iterator[tuple[Composed, list[Any]]]:
+        """Render the template with bound parameters for successive batches of rows,
+        such as `INSERT INTO items VALUES {{ rows | sqlvalues }}`,
+        so that every statement stays within PostgreSQL's limit of parameters.
+        Rows are consumed lazily, one batch at a time
+
+        Args:
+            rows: rows to split into batches
+            params: other template arguments
+            rows_param: name of the template argument receiving each batch
+            batch_size: rows per statement, defaults to as many as fit into `max_params`,
+                judging by the parameters of the first row and the ones outside the rows
+            max_params: maximum number of parameters in a statement.
+                Batches that still have too many, such as when rows differ in length,
+                are split in half until they fit
+
+        Yields:
+            query and its parameters for every batch
+
+        Raises:
+            ValueError: if a statement with a single row has more than `max_params` parameters
+        """
+        iterator = iter(rows)
+        first = next(iterator, _NO_VALUE)
+        if first is _NO_VALUE:
+            return
+
+        if batch_size is None:
+            # Render the first row once and twice to tell apart the parameters of every row
+            # from the ones bound outside the rows
+            one = len(self.render_params({**params, rows_param: [first]})[1])
+            two = len(self.render_params({**params, rows_param: [first, first]})[1])
+            per_row = two - one
+            fixed = max(0, one - per_row)
+            batch_size = max(1, (max_params - fixed) // max(1, per_row))
+        iterator = chain([first], iterator)
+
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+
+            yield from self._render_batch(batch, params, rows_param, max_params)
+
+    def _render_batch(
+        self,
+        batch: list[Any],
+        params: Mapping[str, Any],
+        rows_param: str,
+        max_params: int,
+    ) -> Iterator[tuple[Composed, list[Any]]]:
+        query, bound = self.render_params({**params, rows_param: batch})
+        if len(bound) <= max_params:
+            yield query, bound
+            return
+
+        if len(batch) == 1:
+            raise ValueError(
+                f"Statement with a single row has {len(bound)} parameters,"
+                f" more than max_params={max_params}"
+            )
+
+        half = len(batch) // 2
+        yield from self._render_batch(batch[:half], params, rows_param, max_params)
+        yield from self._render_batch(batch[half:], params, rows_param, max_params)
 
     def make_module(
         self,
@@ -94,34 +807,118 @@ class SqlTemplate:
         Returns:
             module wrapper
         """
-        recorder = CONTEXT.recorder("dynamic")
+        observer = self.observer
+        if observer is not None:
+            start = perf_counter()
+
+        recorder = CONTEXT.recorder(_DYNAMIC)
         with recorder:
             module = self._template.make_module(vars, shared, locals)
         dynamic_args = recorder.unwrap()
 
-        return SqlTemplateModule(module, {**self._static_args, **dynamic_args})
+        if observer is not None:
+            self._notify("make_module", start, perf_counter(), dynamic_args, [])
+
+        return SqlTemplateModule(module, self._args(dynamic_args))
+
+    async def make_module_async(
+        self,
+        vars: Optional[dict[str, Any]] = None,
+        shared: bool = False,
+        locals: Optional[Mapping[str, Any]] = None,
+    ) -> SqlTemplateModule:
+        """
+        Same as [jinja2.Template.make_module_async][], but returns a wrapper that remembers all the format arguments
+
+        Returns:
+            module wrapper
+        """
+        observer = self.observer
+        if observer is not None:
+            start = perf_counter()
+
+        recorder = CONTEXT.recorder(_DYNAMIC)
+        with recorder:
+            module = await self._template.make_module_async(vars, shared, locals)
+        dynamic_args = recorder.unwrap()
+
+        if observer is not None:
+            self._notify("make_module_async", start, perf_counter(), dynamic_args, [])
+
+        return SqlTemplateModule(module, self._args(dynamic_args))
 
 
 class SqlTemplateModule:
-    def __init__(self, module: TemplateModule, args: dict[str, Any]) -> None:
+    def __init__(self, module: TemplateModule, args: Mapping[str, list[Any]]) -> None:
         """Wrapper over jinja2.environment.TemplateModule that stores all the format arguments
-        for use in [SQL.format][psycopg.sql.SQL.format]
+        recorded while rendering it
+
+        The module's output can't change once it's created,
+        so it's composed on the first call to [render][jinja_psycopg.renderer.SqlTemplateModule.render]
+        and reused afterwards
 
         Args:
             module: inner module
-            args: args recorded during module creation
+            args: args recorded during template and module creation, by key prefix
         """
 
         self._module = module
         self._args = args
+        self._composed: Optional[Composed] = None
+        self._strings: WeakKeyDictionary[AdaptContext, str] = WeakKeyDictionary()
+        self._string: Optional[str] = None
 
     def render(self) -> Composed:
         """
         Returns:
             a formatted SQL statement
         """
-        composed = SQL(str(self._module)).format(**self._args)
-        return escape_percents(composed)
+        composed = self._composed
+        if composed is None:
+            composed = self._composed = compose([str(self._module)], self._args)
+
+        return composed
+
+    def as_string(self, context: Optional[AdaptContext] = None) -> str:
+        """Same as `render().as_string(context)`, but the string is cached for every connection
+
+        Args:
+            context: connection or cursor whose encoding and adapters are used,
+                `None` to use the defaults
+
+        Returns:
+            the formatted SQL statement as a string
+        """
+        if context is None:
+            string = self._string
+            if string is None:
+                string = self._string = self.render().as_string(None)
+            return string
+
+        string = self._strings.get(context)
+        if string is None:
+            string = self._strings[context] = self.render().as_string(context)
+
+        return string
+
+    def call(self, name: str, *args, **kwargs) -> Composed:
+        """Call a macro of the module, recording the values it outputs
+
+        Args:
+            name: macro name
+            *args: macro arguments
+            **kwargs: macro keyword arguments
+
+        Returns:
+            the macro's output as SQL
+        """
+        macro = getattr(self._module, name)
+
+        recorder = CONTEXT.recorder(_CALL)
+        with recorder:
+            output = macro(*args, **kwargs)
+
+        return compose([output], {**self._args, _CALL: recorder.unwrap()})
 
     @property
     def inner(self) -> TemplateModule:
@@ -137,22 +934,53 @@ class SqlTemplateModule:
 
 
 class JinjaPsycopg:
-    def __init__(self, env: Optional[Environment] = None) -> None:
+    def __init__(
+        self,
+        env: Optional[Environment] = None,
+        cache_size: Optional[int] = 128,
+        observer: Optional[RenderObserver] = None,
+        query_cache_size: Optional[int] = 256,
+        prepare_threshold: Optional[int] = 5,
+    ) -> None:
         """Wrapper over [jinja2.Environment][] that generates `SqlTemplate`s
 
+        A renderer and its templates can be shared between threads and asyncio tasks:
+        values are recorded in a [contextvars.ContextVar][], which is separate for every thread and task,
+        and the caches are locked. The environment is only modified here,
+        so it shouldn't be changed once rendering starts
+
         Args:
             env: base jinja environment
+            cache_size: number of compiled template strings kept by
+                [render][jinja_psycopg.renderer.JinjaPsycopg.render],
+                `None` for no limit, `0` to disable the cache
+            observer: callback receiving a [RenderEvent][jinja_psycopg.instrument.RenderEvent]
+                with the timings of every compilation and render
+            query_cache_size: number of distinct queries kept as bytes by
+                [execute][jinja_psycopg.renderer.JinjaPsycopg.execute], `None` for no limit
+            prepare_threshold: number of executions of the same query
+                after which `execute` prepares it on the server, `None` to leave it to psycopg
         """
         self._env = env or Environment()
+        self._observer = observer
+        self._template_cache = LRUCache[tuple[str, bool, bool], SqlTemplate](cache_size)
+        self._query_cache = QueryCache(query_cache_size, prepare_threshold)
         self._prepare_environment()
 
     def _prepare_environment(self):
         """Override this to inject your own globals and filters"""
 
         self._env.add_extension(PsycopgExtension)
+        if self._env.loader is not None and not isinstance(
+            self._env.loader, PsycopgLoader
+        ):
+            self._env.loader = PsycopgLoader(self._env.loader, CONTEXT)
+
         self._env.filters["psycopg"] = psycopg_filter
         self._env.filters["sql"] = sql_filter
         self._env.filters["sqljoin"] = sql_join_filter
+        self._env.filters["anyarray"] = anyarray_filter
+        self._env.filters["sqlvalues"] = sql_values_filter
 
     def from_string(
         self, source: str, dedent: bool = True, strip: bool = True
@@ -175,11 +1003,68 @@ class JinjaPsycopg:
         if strip:
             source = source.strip()
 
-        recorder = CONTEXT.recorder("static")
+        observer = self._observer
+        if observer is not None:
+            start = perf_counter()
+
+        ast = self._env.parse(source)
+        if observer is not None:
+            parsed = perf_counter()
+
+        recorder = CONTEXT.recorder(_STATIC)
         with recorder:
-            template = self._env.from_string(source)
+            shape = StaticShape.analyze(ast, self._env)
+            if observer is not None:
+                analyzed = perf_counter()
+
+            template = self._env.from_string(ast)
+
+        sql_template = SqlTemplate(
+            template, recorder.unwrap(), shape, source_id(source), observer
+        )
+
+        if observer is not None:
+            end = perf_counter()
+            observer(
+                RenderEvent(
+                    sql_template.template_id,
+                    "from_string",
+                    {
+                        "parse": parsed - start,
+                        "analyze": analyzed - parsed,
+                        "compile": end - analyzed,
+                    },
+                    len(sql_template._static_args),
+                    0,
+                    0,
+                )
+            )
 
-        return SqlTemplate(template, recorder.unwrap())
+        return sql_template
+
+    def get_template(
+        self,
+        name: str,
+        parent: Optional[str] = None,
+        globals: Optional[MutableMapping[str, Any]] = None,
+    ) -> SqlTemplate:
+        """Same as [jinja2.Environment.get_template][], requires the environment to have a loader.
+
+        Unlike [from_string][jinja_psycopg.renderer.JinjaPsycopg.from_string],
+        constant blocks like `{{ 'text' }}` are evaluated when rendering,
+        so compiled templates can be stored in the environment's
+        [bytecode cache][jinja2.BytecodeCache]
+
+        Args:
+            name: template name
+            parent: name of the importing template, see [jinja2.Environment.join_path][]
+            globals: extra template globals
+
+        Returns:
+            loaded template
+        """
+        template = self._env.get_template(name, parent, globals)
+        return SqlTemplate(template, [], template_id=name, observer=self._observer)
 
     def render(
         self,
@@ -190,6 +1075,9 @@ class JinjaPsycopg:
     ) -> Composed:
         """Shorthand for rendering a template or template string
 
+        Compiled template strings are kept in an LRU cache,
+        see [cache_info][jinja_psycopg.renderer.JinjaPsycopg.cache_info]
+
         Args:
             template: template or template string
             params: template arguments
@@ -201,6 +1089,435 @@ class JinjaPsycopg:
         """
 
         if isinstance(template, str):
-            template = self.from_string(template, dedent=dedent, strip=strip)
+            template = self._cached_from_string(template, dedent, strip)
 
         return template.render(params)
+
+    async def render_async(
+        self,
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> Composed:
+        """Async version of [render][jinja_psycopg.renderer.JinjaPsycopg.render],
+            requires an environment with `enable_async=True`
+
+        Args:
+            template: template or template string
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            rendered SQL
+        """
+
+        if isinstance(template, str):
+            template = self._cached_from_string(template, dedent, strip)
+
+        return await template.render_async(params)
+
+    def render_string(
+        self,
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        context: Optional[OfflineContext] = None,
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> str:
+        """Render a template or template string to SQL text, without a connection
+
+        Args:
+            template: template or template string
+            params: template arguments
+            context: adaptation settings, defaults to UTF-8 with standard conforming strings
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            rendered SQL text
+        """
+
+        composed = self.render(template, params, dedent, strip)
+        return (context or DEFAULT_CONTEXT).as_string(composed)
+
+    def render_params(
+        self,
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+        named: bool = False,
+    ) -> tuple[Composed, Union[list[Any], dict[str, Any]]]:
+        """Shorthand for rendering a template or template string with bound parameters,
+            see [SqlTemplate.render_params][jinja_psycopg.renderer.SqlTemplate.render_params]
+
+        Args:
+            template: template or template string
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+            named: use named placeholders like `%(p0)s` instead of `%s`
+
+        Returns:
+            rendered SQL and its parameters
+        """
+
+        if isinstance(template, str):
+            template = self._cached_from_string(template, dedent, strip)
+
+        if named:
+            return template.render_named_params(params)
+        return template.render_params(params)
+
+    def render_many(
+        self,
+        template: Union[str, SqlTemplate],
+        params_seq: Iterable[Mapping[str, Any]],
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> list[tuple[Composed, list[list[Any]]]]:
+        """Shorthand for [SqlTemplate.render_many][jinja_psycopg.renderer.SqlTemplate.render_many]
+
+        Args:
+            template: template or template string
+            params_seq: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            list of distinct queries, each with its rows of parameters
+        """
+
+        if isinstance(template, str):
+            template = self._cached_from_string(template, dedent, strip)
+
+        return template.render_many(params_seq)
+
+    def render_batches(
+        self,
+        template: Union[str, SqlTemplate],
+        rows: Iterable[Any],
+        params: Mapping[str, Any] = {},
+        rows_param: str = "rows",
+        batch_size: Optional[int] = None,
+        max_params: int = 65535,
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> Iterator[tuple[Composed, list[Any]]]:
+        """Shorthand for [SqlTemplate.render_batches][jinja_psycopg.renderer.SqlTemplate.render_batches]
+
+        Args:
+            template: template or template string
+            rows: rows to split into batches
+            params: other template arguments
+            rows_param: name of the template argument receiving each batch
+            batch_size: rows per statement, defaults to as many as fit into `max_params`
+            max_params: maximum number of parameters in a statement
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Yields:
+            query and its parameters for every batch
+        """
+
+        if isinstance(template, str):
+            template = self._cached_from_string(template, dedent, strip)
+
+        return template.render_batches(rows, params, rows_param, batch_size, max_params)
+
+    def executemany(
+        self,
+        cursor: Cursor[Any],
+        template: Union[str, SqlTemplate],
+        params_seq: Iterable[Mapping[str, Any]],
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> None:
+        """Render the template for every set of arguments
+        and run each distinct query once with [psycopg.Cursor.executemany][],
+        which pipelines the parameter rows
+
+        Args:
+            cursor: cursor to execute with
+            template: template or template string
+            params_seq: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+        """
+
+        for query, rows in self.render_many(template, params_seq, dedent, strip):
+            cursor.executemany(query, rows)
+
+    async def executemany_async(
+        self,
+        cursor: AsyncCursor[Any],
+        template: Union[str, SqlTemplate],
+        params_seq: Iterable[Mapping[str, Any]],
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> None:
+        """Async version of [executemany][jinja_psycopg.renderer.JinjaPsycopg.executemany]
+
+        Args:
+            cursor: cursor to execute with
+            template: template or template string
+            params_seq: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+        """
+
+        for query, rows in self.render_many(template, params_seq, dedent, strip):
+            await cursor.executemany(query, rows)
+
+    def execute(
+        self,
+        connection: Union[Connection[Any], ConnectionPool],
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> Cursor[Any]:
+        """Render a template with bound parameters and execute it.
+
+        Queries are cached as bytes, keyed by their text with placeholders,
+        so repeated executions skip the conversion, and a query executed
+        `prepare_threshold` times is prepared on the server from then on.
+        See [execute_info][jinja_psycopg.renderer.JinjaPsycopg.execute_info] for the statistics
+
+        Args:
+            connection: connection, or a [psycopg_pool.ConnectionPool][] to take one from.
+                The results of a client-side cursor are fetched together with the query,
+                so they stay readable after the connection returns to the pool
+            template: template or template string
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            cursor with the results
+        """
+
+        if not hasattr(connection, "execute"):
+            with connection.connection() as conn:  # type:ignore
+                return self.execute(conn, template, params, dedent, strip)
+
+        query, bound = self.render_params(template, params, dedent, strip)
+        query_bytes, prepare = self._query_cache.lookup(
+            _shape_key(query), query, connection
+        )
+        return connection.execute(
+            query_bytes, bound, prepare=prepare or None
+        )  # type:ignore
+
+    async def execute_async(
+        self,
+        connection: Union[AsyncConnection[Any], AsyncConnectionPool],
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> AsyncCursor[Any]:
+        """Async version of [execute][jinja_psycopg.renderer.JinjaPsycopg.execute]
+
+        Args:
+            connection: connection, or a [psycopg_pool.AsyncConnectionPool][] to take one from
+            template: template or template string
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            cursor with the results
+        """
+
+        if not hasattr(connection, "execute"):
+            async with connection.connection() as conn:  # type:ignore
+                return await self.execute_async(conn, template, params, dedent, strip)
+
+        if isinstance(template, str):
+            template = self._cached_from_string(template, dedent, strip)
+
+        if self._env.is_async:
+            query, bound = await template.render_params_async(params)
+        else:
+            query, bound = template.render_params(params)
+
+        query_bytes, prepare = self._query_cache.lookup(
+            _shape_key(query), query, connection
+        )
+        return await connection.execute(
+            query_bytes, bound, prepare=prepare or None
+        )  # type:ignore
+
+    def render_script(
+        self,
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> list[Composed]:
+        """Shorthand for [SqlTemplate.render_script][jinja_psycopg.renderer.SqlTemplate.render_script]
+
+        Args:
+            template: template or template string
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            rendered statements
+        """
+
+        if isinstance(template, str):
+            template = self._cached_from_string(template, dedent, strip)
+
+        return template.render_script(params)
+
+    def execute_script(
+        self,
+        connection: Connection[Any],
+        template: Union[str, SqlTemplate],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> list[StatementResult]:
+        """Render a template containing several statements
+        and run them in pipeline mode, see [execute_script][jinja_psycopg.script.execute_script]
+
+        Args:
+            connection: connection to execute with
+            template: template or template string
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            every statement with its cursor and approximate timing
+        """
+        return execute_script(
+            connection, self.render_script(template, params, dedent, strip)
+        )
+
+    def execute_info(self) -> ExecuteInfo:
+        """
+        Returns:
+            query cache and prepared statement statistics of
+                [execute][jinja_psycopg.renderer.JinjaPsycopg.execute]
+        """
+        return self._query_cache.info()
+
+    def copy_rows(
+        self,
+        cursor: Cursor[Any],
+        template: Union[str, SqlTemplate],
+        rows: Iterable[Sequence[Any]],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> int:
+        """Run a `COPY ... FROM STDIN` statement rendered from the template,
+        such as `COPY {{ table }} ({{ columns | sqljoin(', ') }}) FROM STDIN`,
+        and stream the rows into it with [psycopg.Copy.write_row][]
+
+        Args:
+            cursor: cursor to copy with
+            template: template or template string of the COPY statement
+            rows: rows to write, consumed lazily
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            number of rows written
+        """
+
+        statement = self.render(template, params, dedent, strip)
+
+        count = 0
+        with cursor.copy(_unescape_percents(statement)) as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+
+        return count
+
+    async def copy_rows_async(
+        self,
+        cursor: AsyncCursor[Any],
+        template: Union[str, SqlTemplate],
+        rows: Union[Iterable[Sequence[Any]], AsyncIterable[Sequence[Any]]],
+        params: dict[str, Any] = {},
+        dedent: bool = True,
+        strip: bool = True,
+    ) -> int:
+        """Async version of [copy_rows][jinja_psycopg.renderer.JinjaPsycopg.copy_rows].
+        The template is rendered with [render_async][jinja_psycopg.renderer.JinjaPsycopg.render_async]
+        if the environment is async
+
+        Args:
+            cursor: cursor to copy with
+            template: template or template string of the COPY statement
+            rows: rows to write, from a regular or an async iterable
+            params: template arguments
+            dedent: remove indentation from template string
+            strip: remove leading and trailing spaces
+
+        Returns:
+            number of rows written
+        """
+
+        if self._env.is_async:
+            statement = await self.render_async(template, params, dedent, strip)
+        else:
+            statement = self.render(template, params, dedent, strip)
+
+        count = 0
+        async with cursor.copy(_unescape_percents(statement)) as copy:
+            if isinstance(rows, AsyncIterable):
+                async for row in rows:
+                    await copy.write_row(row)
+                    count += 1
+            else:
+                for row in rows:
+                    await copy.write_row(row)
+                    count += 1
+
+        return count
+
+    def _cached_from_string(self, source: str, dedent: bool, strip: bool):
+        key = (source, dedent, strip)
+
+        template = self._template_cache.get(key)
+        if template is None:
+            template = self.from_string(source, dedent=dedent, strip=strip)
+            self._template_cache.put(key, template)
+
+        return template
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Returns:
+            hit/miss/eviction statistics of the template string cache
+        """
+        return self._template_cache.info()
+
+    def cache_clear(self) -> None:
+        """Remove all compiled templates from the cache and reset its statistics"""
+        self._template_cache.clear()
+
+    def cache_invalidate(
+        self, source: str, dedent: bool = True, strip: bool = True
+    ) -> bool:
+        """Remove a single template string from the cache
+
+        Args:
+            source: template string, as passed to `render`
+            dedent: same as in `render`
+            strip: same as in `render`
+
+        Returns:
+            whether the template was cached
+        """
+        return self._template_cache.invalidate((source, dedent, strip))
@@ -0,0 +1,252 @@
+from __future__ import annotations
+import re
+from time import perf_counter
+from typing import Any, Iterable, NamedTuple, Optional
+
+from psycopg import Connection, Cursor
+from psycopg.sql import SQL, Composable, Composed
+
+# Start of a string, identifier, comment or dollar-quoted string, or a statement separator
+_TOKEN = re.compile(r"""[;'"]|--|/\*|\$(?:[A-Za-z_\x80-\uffff][\w\x80-\uffff]*)?\$""")
+_IDENTIFIER_CHAR = re.compile(r"[\w$\x80-\uffff]")
+_BLOCK_COMMENT = re.compile(r"/\*|\*/")
+_ESCAPE_STRING_END = re.compile(r"\\.|'", re.DOTALL)
+
+
+class _Scanner:
+    # Tracks what the SQL text is inside of, across the text fragments between values
+
+    def __init__(self) -> None:
+        self.end: Optional[str] = None
+        self.comment_depth = 0
+
+    def separators(self, text: str) -> list[int]:
+        """Positions of the `;` outside of strings, identifiers and comments"""
+        found = []
+        pos = 0
+        while pos < len(text):
+            if self.end is None:
+                match = _TOKEN.search(text, pos)
+                if match is None:
+                    break
+
+                token = match.group()
+                pos = match.end()
+                if token == ";":
+                    found.append(match.start())
+                elif token == "'":
+                    start = match.start()
+                    escape = (
+                        start > 0
+                        and text[start - 1] in "eE"
+                        and (start < 2 or not _IDENTIFIER_CHAR.match(text[start - 2]))
+                    )
+                    self.end = "\\'" if escape else "'"
+                elif token == '"':
+                    self.end = '"'
+                elif token == "--":
+                    self.end = "\n"
+                elif token == "/*":
+                    self.end = "*/"
+                    self.comment_depth = 1
+                elif match.start() > 0 and _IDENTIFIER_CHAR.match(
+                    text[match.start() - 1]
+                ):
+                    # `$` inside an identifier like foo$bar$
+                    pos = match.start() + 1
+                else:
+                    self.end = token
+            else:
+                pos = self._skip(text, pos)
+
+        return found
+
+    def _skip(self, text: str, pos: int) -> int:
+        # Advance past the end of the current string or comment,
+        # or to the end of the text if it doesn't end there
+        end = self.end
+        if end in ("'", '"'):
+            index = text.find(end, pos)
+            if index < 0:
+                return len(text)
+            if text.startswith(end, index + 1):
+                return index + 2  # escaped quote
+            self.end = None
+            return index + 1
+
+        if end == "\\'":
+            while True:
+                match = _ESCAPE_STRING_END.search(text, pos)
+                if match is None:
+                    return len(text)
+                pos = match.end()
+                if match.group() == "'":
+                    if text.startswith("'", pos):
+                        pos += 1
+                        continue
+                    self.end = None
+                    return pos
+
+        if end == "*/":
+            while True:
+                match = _BLOCK_COMMENT.search(text, pos)
+                if match is None:
+                    return len(text)
+                pos = match.end()
+                self.comment_depth += 1 if match.group() == "/*" else -1
+                if self.comment_depth == 0:
+                    self.end = None
+                    return pos
+
+        index = text.find(end, pos)  # type:ignore
+        if index < 0:
+            return len(text)
+        self.end = None
+        return index + len(end)  # type:ignore
+
+
+def _statement(items: list[Composable]) -> Optional[Composed]:
+    # Strip the whitespace around a statement, None if nothing is left
+    while items and type(items[0]) is SQL:
+        text = items[0].as_string(None).lstrip()
+        if text:
+            items[0] = SQL(text)
+            break
+        items.pop(0)
+
+    while items and type(items[-1]) is SQL:
+        text = items[-1].as_string(None).rstrip()
+        if text:
+            items[-1] = SQL(text)
+            break
+        items.pop()
+
+    return Composed(items) if items else None
+
+
+def split_statements(composed: Composed) -> list[Composed]:
+    """Split rendered SQL into statements at the `;` between them.
+
+    Only the SQL text is scanned, skipping `;` within strings, quoted identifiers,
+    dollar-quoted strings and comments. This includes the SQL of values flattened by
+    [compose][jinja_psycopg.renderer.compose], like the output of `sqljoin`.
+    Identifiers and literals are never scanned, since psycopg quotes them
+
+    Args:
+        composed: rendered SQL
+
+    Returns:
+        statements, without the `;` and surrounding whitespace
+    """
+    scanner = _Scanner()
+    statements: list[Composed] = []
+    current: list[Composable] = []
+
+    for item in composed:
+        if type(item) is not SQL:
+            current.append(item)
+            continue
+
+        text = item.as_string(None)
+        start = 0
+        for separator in scanner.separators(text):
+            current.append(SQL(text[start:separator]))
+            statement = _statement(current)
+            if statement is not None:
+                statements.append(statement)
+
+            current = []
+            start = separator + 1
+
+        if start < len(text):
+            current.append(SQL(text[start:]))
+
+    statement = _statement(current)
+    if statement is not None:
+        statements.append(statement)
+
+    return statements
+
+
+class StatementResult(NamedTuple):
+    """Result of a statement run by [execute_script][jinja_psycopg.script.execute_script]"""
+
+    statement: Composed
+    cursor: Cursor[Any]
+    """Cursor holding the statement's results"""
+    duration: float
+    """Approximate seconds between the results of the previous statement
+    (or the start of the script) and this statement's results arriving, as seen by the client.
+
+    psycopg reads results in batches: the ones that have arrived while sending more statements,
+    and all the remaining ones at the end of the script. Results read in the same batch
+    share one arrival time, so the first of them gets the time since the previous batch,
+    and the rest get 0. The durations add up to the time the whole script took.
+    Without pipeline mode, statements run one by one, and this is the time each of them took"""
+
+
+def execute_script(
+    connection: Connection[Any], statements: Iterable[Composed]
+) -> list[StatementResult]:
+    """Run statements in [pipeline mode](https://www.psycopg.org/psycopg3/docs/advanced/pipeline.html),
+    sending them without waiting for each other's results.
+    Pipeline mode requires psycopg 3.1, with older versions the statements run one by one
+
+    Args:
+        connection: connection to execute with
+        statements: statements, such as the ones returned by
+            [render_script][jinja_psycopg.renderer.SqlTemplate.render_script]
+
+    Returns:
+        every statement with its cursor and approximate timing,
+            see [StatementResult.duration][jinja_psycopg.script.StatementResult.duration]
+
+    Raises:
+        psycopg.Error: the first error, after which the following statements don't run
+    """
+    if not hasattr(connection, "pipeline"):
+        return _execute_sequentially(connection, statements)
+
+    pending: list[tuple[Composed, Cursor[Any]]] = []
+    arrived: list[float] = []
+    start = perf_counter()
+
+    def collect(finished: bool = False):
+        # psycopg reads the results that have arrived while sending more statements
+        now = perf_counter()
+        while len(arrived) < len(pending) and (
+            finished or pending[len(arrived)][1].pgresult is not None
+        ):
+            arrived.append(now)
+
+    with connection.pipeline() as pipeline:
+        for statement in statements:
+            # With parameters, even empty ones, psycopg turns the escaped '%%' back into '%'
+            pending.append((statement, connection.execute(statement, ())))
+            collect()
+
+        pipeline.sync()
+        collect(finished=True)
+
+    results = []
+    previous = start
+    for (statement, cursor), time in zip(pending, arrived):
+        results.append(StatementResult(statement, cursor, time - previous))
+        previous = time
+
+    return results
+
+
+def _execute_sequentially(
+    connection: Connection[Any], statements: Iterable[Composed]
+) -> list[StatementResult]:
+    # Without pipeline mode, every statement waits for the previous one's results
+    results = []
+    previous = perf_counter()
+    for statement in statements:
+        cursor = connection.execute(statement, ())
+        now = perf_counter()
+        results.append(StatementResult(statement, cursor, now - previous))
+        previous = now
+
+    return results
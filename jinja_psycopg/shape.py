@@ -0,0 +1,201 @@
+from __future__ import annotations
+from typing import Any, Callable, Mapping, Optional
+
+from jinja2 import Environment, Undefined, nodes
+from jinja2.utils import _PassArg
+
+_MISSING = object()
+
+Evaluator = Callable[[Mapping[str, Any], Mapping[str, Any]], Any]
+
+
+class StaticShape:
+    def __init__(
+        self, env: Environment, data: list[str], slots: list[Evaluator]
+    ) -> None:
+        """Precomputed skeleton of a template whose output structure
+        doesn't depend on its parameters, such as `SELECT * FROM {{ table }} WHERE id = {{ id }}`.
+
+        Produces the same output as the compiled template,
+        but only evaluates the `{{ }}` expressions, without running jinja.
+        Its output is never captured by other templates,
+        so '%' is escaped as '%%' once when analyzing, instead of on every render
+
+        Args:
+            env: environment the template belongs to
+            data: template data surrounding the expressions, with '%' escaped,
+                one item longer than `slots`
+            slots: evaluators for the `{{ }}` expressions
+        """
+
+        self._env = env
+        self._data = data
+        self._slots = slots
+
+    @classmethod
+    def analyze(cls, ast: nodes.Template, env: Environment) -> Optional[StaticShape]:
+        """Must be called while recording static args and before compiling the template,
+        since constant `{{ }}` blocks are evaluated here and folded into the template data in place
+
+        Args:
+            ast: parsed template
+            env: environment the template belongs to
+
+        Returns:
+            skeleton of the template,
+                or `None` if its output depends on the control flow
+        """
+
+        # Output that goes through autoescape or finalize can't be precomputed
+        if env.is_async or env.finalize is not None or env.autoescape is not False:
+            return None
+
+        eval_ctx = nodes.EvalContext(env)
+        data: list[str] = []
+        slots: list[Evaluator] = []
+        text: list[str] = []
+
+        for node in ast.body:
+            if not isinstance(node, nodes.Output):
+                return None
+
+            for i, child in enumerate(node.nodes):
+                if isinstance(child, nodes.TemplateData):
+                    text.append(child.data)
+                    continue
+
+                if not (isinstance(child, nodes.Filter) and child.name == "psycopg"):
+                    return None
+                if child.node is None:
+                    return None
+
+                # Constants are folded into the template data, same as jinja does.
+                # The node is replaced, so that jinja doesn't record the value again
+                try:
+                    const = str(child.as_const(eval_ctx))
+                except nodes.Impossible:
+                    pass
+                else:
+                    node.nodes[i] = nodes.TemplateData(const, lineno=child.lineno)
+                    text.append(const)
+                    continue
+
+                evaluator = _compile_expression(child.node, env)
+                if evaluator is None:
+                    return None
+
+                data.append("".join(text).replace("%", "%%"))
+                text.clear()
+                slots.append(evaluator)
+
+        data.append("".join(text).replace("%", "%%"))
+        return cls(env, data, slots)
+
+    def generate(
+        self, params: Mapping[str, Any], globals: Mapping[str, Any]
+    ) -> Optional[list[str]]:
+        """
+        Args:
+            params: template arguments
+            globals: template globals
+
+        Returns:
+            template output, same as [jinja2.Template.generate][] would produce
+                but with '%' escaped as '%%', or `None` if the arguments need to be handled by jinja
+                (such as a missing variable or an exception within an expression).
+                In that case, the caller must discard anything the expressions' filters recorded
+        """
+        psycopg = self._env.filters["psycopg"]
+        chunks = [self._data[0]]
+
+        # Every slot is output before evaluating the next one, same as jinja does,
+        # so that values and parameters are recorded in the same order
+        for slot, data in zip(self._slots, self._data[1:]):
+            try:
+                value = slot(params, globals)
+            except Exception:
+                return None
+
+            if value is _MISSING:
+                return None
+
+            chunks.append(psycopg(value).replace("%", "%%"))
+            chunks.append(data)
+
+        return chunks
+
+
+def _compile_expression(node: nodes.Expr, env: Environment) -> Optional[Evaluator]:
+    """
+    Returns:
+        function evaluating the expression,
+            or `None` if the expression isn't a simple variable lookup
+    """
+
+    if isinstance(node, nodes.Name) and node.ctx == "load":
+        name = node.name
+
+        def load(params: Mapping[str, Any], globals: Mapping[str, Any]) -> Any:
+            if name in params:
+                return params[name]
+            return globals.get(name, _MISSING)
+
+        return load
+
+    if isinstance(node, nodes.Getattr):
+        inner = _compile_expression(node.node, env)
+        if inner is None:
+            return None
+        attr = node.attr
+
+        def getattr(params: Mapping[str, Any], globals: Mapping[str, Any]) -> Any:
+            obj = inner(params, globals)
+            if obj is _MISSING:
+                return _MISSING
+
+            value = env.getattr(obj, attr)
+            return _MISSING if isinstance(value, Undefined) else value
+
+        return getattr
+
+    if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const):
+        inner = _compile_expression(node.node, env)
+        if inner is None:
+            return None
+        key = node.arg.value
+
+        def getitem(params: Mapping[str, Any], globals: Mapping[str, Any]) -> Any:
+            obj = inner(params, globals)
+            if obj is _MISSING:
+                return _MISSING
+
+            value = env.getitem(obj, key)
+            return _MISSING if isinstance(value, Undefined) else value
+
+        return getitem
+
+    if isinstance(node, nodes.Filter) and node.node is not None:
+        inner = _compile_expression(node.node, env)
+        func = env.filters.get(node.name)
+        if inner is None or func is None or _PassArg.from_obj(func) is not None:
+            return None
+        if node.dyn_args is not None or node.dyn_kwargs is not None:
+            return None
+        if not all(isinstance(arg, nodes.Const) for arg in node.args):
+            return None
+        if not all(isinstance(kwarg.value, nodes.Const) for kwarg in node.kwargs):
+            return None
+
+        args = [arg.value for arg in node.args]  # type:ignore
+        kwargs = {kwarg.key: kwarg.value.value for kwarg in node.kwargs}  # type:ignore
+
+        def filter(params: Mapping[str, Any], globals: Mapping[str, Any]) -> Any:
+            value = inner(params, globals)
+            if value is _MISSING:
+                return _MISSING
+
+            return func(value, *args, **kwargs)
+
+        return filter
+
+    return None
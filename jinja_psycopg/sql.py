@@ -1,4 +1,5 @@
-from typing import Optional, Iterable, Protocol, Union, runtime_checkable
+from functools import lru_cache
+from typing import Any, Callable, Optional, Iterable, Protocol, Union, runtime_checkable
 from psycopg.sql import SQL, Composable
 
 
@@ -19,6 +20,81 @@ SqlLike = Union[Composable, IntoSql]
 SQL or a type convertible to SQL
 """
 
+SqlAdapter = Callable[[Any], Composable]
+"""
+Function converting a value to SQL
+"""
+
+_SQL_ADAPTERS: dict[type, SqlAdapter] = {}
+
+
+def register_sql_adapter(cls: type, adapter: SqlAdapter) -> None:
+    """Register a SQL representation for a type (and its subclasses),
+    as an alternative to implementing [`__sql__`][jinja_psycopg.sql.IntoSql] on it.
+    Registered adapters take precedence over `__sql__`
+
+    Args:
+        cls: type to convert
+        adapter: conversion function
+    """
+    _SQL_ADAPTERS[cls] = adapter
+    get_sql_adapter.cache_clear()
+
+
+def unregister_sql_adapter(cls: type) -> None:
+    """Remove the SQL representation registered for a type
+    with [register_sql_adapter][jinja_psycopg.sql.register_sql_adapter]
+
+    Args:
+        cls: type the adapter was registered for
+
+    Raises:
+        KeyError: if no adapter is registered for this type
+    """
+    del _SQL_ADAPTERS[cls]
+    get_sql_adapter.cache_clear()
+
+
+def _call_sql(value: IntoSql) -> Composable:
+    return value.__sql__()
+
+
+@lru_cache(maxsize=None)
+def get_sql_adapter(cls: type) -> Optional[SqlAdapter]:
+    """
+    Args:
+        cls: type of the value
+
+    Returns:
+        function converting values of this type to SQL,
+            or `None` if the type has no SQL representation.
+            The result is memoized per type
+    """
+    for base in cls.__mro__:
+        adapter = _SQL_ADAPTERS.get(base)
+        if adapter is not None:
+            return adapter
+
+    if callable(getattr(cls, "__sql__", None)):
+        return _call_sql
+
+    return None
+
+
+def into_sql(value: Any) -> Any:
+    """
+    Args:
+        value: any value
+
+    Returns:
+        SQL representation of the value if it has one, otherwise the value itself
+    """
+    adapter = get_sql_adapter(type(value))
+    if adapter is not None:
+        return adapter(value)
+
+    return value
+
 
 def sql_filter(value: str) -> SQL:
     """Jinja filter for converting a string to raw SQL
@@ -33,10 +109,7 @@ def _preprocess_before_join(items: Iterable[SqlLike], attribute: Optional[str] =
         if attribute is not None:
             item = getattr(item, attribute)
 
-        if isinstance(item, IntoSql):
-            item = item.__sql__()
-
-        yield item
+        yield into_sql(item)
 
 
 def sql_join_filter(
@@ -0,0 +1,10 @@
+import os
+import pytest
+import psycopg
+
+
+@pytest.fixture
+def conn():
+    connection = psycopg.connect(os.environ.get("POSTGRES_URL", ""))
+    yield connection
+    connection.close()
@@ -0,0 +1,72 @@
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache
+from psycopg import Connection, sql
+
+from jinja_psycopg import JinjaPsycopg
+from jinja_psycopg.precompile import make_environment, precompile
+
+TEMPLATES = {
+    "columns.sql": "{{ columns | sqljoin(', ') }}",
+    "select.sql": "SELECT {% include 'columns.sql' %}, {{ 'static' }} FROM {{ table }} WHERE id = {{ id }}",
+}
+PARAMS = {
+    "columns": [sql.Identifier("a"), sql.Identifier("b")],
+    "table": sql.Identifier("foo"),
+    "id": 5,
+}
+EXPECTED = 'SELECT "a", "b", \'static\' FROM "foo" WHERE id = 5'
+
+
+def test_get_template(conn: Connection):
+    renderer = JinjaPsycopg(Environment(loader=DictLoader(TEMPLATES)))
+    template = renderer.get_template("select.sql")
+
+    assert template.template_id == "select.sql"
+    assert template.render(PARAMS).as_string(conn) == EXPECTED
+    assert template.render(PARAMS, id=6).as_string(conn) == EXPECTED[:-1] + "6"
+
+
+def test_include_during_render(conn: Connection):
+    renderer = JinjaPsycopg(Environment(loader=DictLoader(TEMPLATES)))
+    template = renderer.from_string(
+        "{{ 'first' }}, {{ id }}, {% include 'select.sql' %}"
+    )
+
+    for id in [5, 6]:
+        expected = f"'first', {id}, {EXPECTED[:-1]}{id}"
+        assert template.render(PARAMS, id=id).as_string(conn) == expected
+
+
+def test_bytecode_cache(conn: Connection, tmp_path):
+    def make_renderer():
+        return JinjaPsycopg(
+            Environment(
+                loader=DictLoader(TEMPLATES),
+                bytecode_cache=FileSystemBytecodeCache(str(tmp_path)),
+            )
+        )
+
+    first = make_renderer().get_template("select.sql")
+    assert first.render(PARAMS).as_string(conn) == EXPECTED
+    assert list(tmp_path.iterdir())
+
+    renderer = make_renderer()
+    renderer._env.compile = None  # type:ignore
+    second = renderer.get_template("select.sql")
+    assert second.render(PARAMS).as_string(conn) == EXPECTED
+
+
+def test_precompile(conn: Connection, tmp_path):
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    for name, source in TEMPLATES.items():
+        (templates / name).write_text(source)
+    (templates / "README.md").write_text("not a template")
+
+    cache = str(tmp_path / "cache")
+    compiled = precompile(str(templates), cache, workers=2)
+    assert sorted(compiled) == sorted(TEMPLATES)
+
+    renderer = JinjaPsycopg(make_environment(str(templates), cache))
+    renderer._env.compile = None  # type:ignore
+    template = renderer.get_template("select.sql")
+    assert template.render(PARAMS).as_string(conn) == EXPECTED
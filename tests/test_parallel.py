@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from psycopg import Connection, sql
+
+from jinja_psycopg import JinjaPsycopg
+from jinja_psycopg.parallel import TemplateSource, render_parallel
+
+QUERY = """\
+SELECT * FROM {{ table }}
+WHERE {% for column in columns %}{{ column }} = {{ loop.index * id }}{% if not loop.last %} AND {% endif %}{% endfor %}"""
+
+
+def params(i: int):
+    return {
+        "table": sql.Identifier(f"table_{i}"),
+        "columns": [sql.Identifier("a"), sql.Identifier("b")],
+        "id": i,
+    }
+
+
+def expected(i: int):
+    return f'SELECT * FROM "table_{i}"\nWHERE "a" = {i} AND "b" = {2 * i}'
+
+
+def test_shared_renderer(conn: Connection):
+    renderer = JinjaPsycopg()
+    barrier = threading.Barrier(8)
+
+    def render_many(thread: int):
+        barrier.wait()
+        results = []
+        for i in range(thread * 100, thread * 100 + 100):
+            composed = renderer.render(QUERY, params(i))
+            static = renderer.render("SELECT {{ id }}", {"id": i})
+            query, bound = renderer.render_params(QUERY, params(i))
+            results.append((i, composed, static, bound))
+        return results
+
+    with ThreadPoolExecutor(8) as executor:
+        for results in executor.map(render_many, range(8)):
+            for i, composed, static, bound in results:
+                assert composed.as_string(conn) == expected(i)
+                assert static.as_string(conn) == f"SELECT {i}"
+                assert bound == [i, 2 * i]
+
+
+def test_render_parallel_threads(conn: Connection):
+    template = JinjaPsycopg().from_string(QUERY)
+
+    with ThreadPoolExecutor(4) as executor:
+        results = render_parallel(template, map(params, range(200)), executor)
+        for i, composed in enumerate(results):
+            assert composed.as_string(conn) == expected(i)
+
+
+def test_render_parallel_processes(conn: Connection):
+    source = TemplateSource(JinjaPsycopg, QUERY)
+
+    with ProcessPoolExecutor(2) as executor:
+        results = render_parallel(source, map(params, range(200)), executor)
+        for i, composed in enumerate(results):
+            assert composed.as_string(conn) == expected(i)
+
+        with pytest.raises(TypeError):
+            render_parallel(source.build(), [], executor)
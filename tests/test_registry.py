@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+from jinja2 import Environment, FileSystemLoader
+from psycopg import Connection, sql
+
+from jinja_psycopg import JinjaPsycopg
+from jinja_psycopg import registry as registry_module
+from jinja_psycopg.registry import TemplateRegistry
+
+PARAMS = {"table": sql.Identifier("foo")}
+
+
+@pytest.fixture
+def templates(tmp_path):
+    (tmp_path / "macros.sql").write_text("{% macro columns() %}a, b{% endmacro %}")
+    (tmp_path / "base.sql").write_text("{% block query %}{% endblock %};")
+    (tmp_path / "report.sql").write_text(
+        "{% extends 'base.sql' %}{% import 'macros.sql' as m %}"
+        "{% block query %}SELECT {{ m.columns() | sql }} FROM {{ table }}{% endblock %}"
+    )
+    (tmp_path / "other.sql").write_text("SELECT 1")
+    return tmp_path
+
+
+def touch(path, text: str):
+    stat = os.stat(path)
+    path.write_text(text)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def make_registry(path) -> TemplateRegistry:
+    return TemplateRegistry(JinjaPsycopg(Environment(loader=FileSystemLoader(path))))
+
+
+def test_registry(conn: Connection, templates):
+    registry = make_registry(templates)
+
+    report = registry.get("report.sql")
+    assert report.render(PARAMS).as_string(conn) == 'SELECT a, b FROM "foo";'
+    assert registry.get("report.sql") is report
+    assert registry.dependents("macros.sql") == {"report.sql"}
+    assert registry.dependents("base.sql") == {"report.sql"}
+
+    registry.get("other.sql")
+    assert registry.poll() == set()
+
+    touch(templates / "macros.sql", "{% macro columns() %}a, b, c{% endmacro %}")
+    assert registry.poll() == {"macros.sql", "report.sql"}
+
+    report = registry.get("report.sql")
+    assert report.render(PARAMS).as_string(conn) == 'SELECT a, b, c FROM "foo";'
+
+
+def test_registry_new_dependency(conn: Connection, templates):
+    registry = make_registry(templates)
+    registry.get("other.sql")
+
+    touch(templates / "other.sql", "{% include 'base.sql' %}")
+    assert registry.poll() == {"other.sql"}
+    assert registry.dependents("base.sql") == {"other.sql"}
+    assert registry.get("other.sql").render().as_string(conn) == ";"
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+def test_registry_watch(conn: Connection, templates, monkeypatch, inotify: bool):
+    if inotify:
+        pytest.importorskip("inotify_simple")
+    else:
+        monkeypatch.setattr(registry_module, "inotify_simple", None)
+
+    registry = make_registry(templates)
+    registry.get("report.sql")
+
+    reloads = []
+    registry.watch(interval=0.05, on_reload=reloads.append)
+    try:
+        time.sleep(0.2)
+        touch(templates / "base.sql", "{% block query %}{% endblock %} LIMIT 1;")
+
+        deadline = time.monotonic() + 5
+        while not reloads and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        registry.stop()
+
+    assert reloads and {"base.sql", "report.sql"} <= reloads[0]
+    rendered = registry.get("report.sql").render(PARAMS).as_string(conn)
+    assert rendered == 'SELECT a, b FROM "foo" LIMIT 1;'
@@ -1,18 +1,21 @@
-import os
+import asyncio
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import date
 from textwrap import dedent
 import pytest
+from jinja2 import DictLoader, Environment
 import psycopg
 from psycopg import Connection, sql
 
+import jinja_psycopg.cache
+import jinja_psycopg.context
 from jinja_psycopg import JinjaPsycopg
-
-
-@pytest.fixture
-def conn():
-    connection = psycopg.connect(os.environ.get("POSTGRES_URL", ""))
-    yield connection
-    connection.close()
+from jinja_psycopg.context import _KeyCache
+from jinja_psycopg.execute import ExecuteInfo
+from jinja_psycopg.offline import OfflineContext
+from jinja_psycopg.sql import register_sql_adapter, unregister_sql_adapter
 
 
 def test_args(conn: Connection):
@@ -285,3 +288,880 @@ def test_escape_percent(conn: Connection):
     params = {"field2": sql.Placeholder("field2")}
 
     assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+
+
+def test_template_cache(conn: Connection):
+    renderer = JinjaPsycopg(cache_size=2)
+    query = "SELECT * FROM {{ table }}"
+
+    for name in ["foo", "bar"]:
+        rendered = renderer.render(query, {"table": sql.Identifier(name)})
+        assert rendered.as_string(conn) == f'SELECT * FROM "{name}"'
+
+    info = renderer.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    renderer.render("SELECT 1")
+    renderer.render("SELECT 2")
+    assert renderer.cache_info().evictions == 1
+
+    assert renderer.cache_invalidate("SELECT 2")
+    assert not renderer.cache_invalidate(query)
+
+    renderer.cache_clear()
+    assert renderer.cache_info() == (0, 0, 0, 2, 0)
+
+
+def test_template_cache_key():
+    renderer = JinjaPsycopg()
+
+    renderer.render("  SELECT 1  ")
+    renderer.render("  SELECT 1  ", strip=False)
+    assert renderer.cache_info().misses == 2
+
+
+def test_template_cache_disabled():
+    renderer = JinjaPsycopg(cache_size=0)
+
+    renderer.render("SELECT 1")
+    renderer.render("SELECT 1")
+    assert renderer.cache_info().currsize == 0
+
+
+def test_render_params(conn: Connection):
+    query = "SELECT * FROM {{ table }} WHERE id = {{ id }} AND name = {{ 'foo' }}"
+    expected = "SELECT * FROM \"sources\" WHERE id = %s AND name = 'foo'"
+    params = {"table": sql.Identifier("sources"), "id": 5}
+
+    composed, bound = JinjaPsycopg().render_params(query, params)
+    assert composed.as_string(conn) == expected
+    assert bound == [5]
+
+
+@pytest.mark.parametrize(
+    "query, expected, params",
+    [
+        (
+            "{% set x %}{{ a }}{% endset %}SELECT {{ b }}, {{ x | sql }}",
+            "SELECT %s, %s",
+            [2, 1],
+        ),
+        (
+            "{% set x %}{{ a }}{% endset %}SELECT {{ x | sql }}, {{ x | sql }}",
+            "SELECT %s, %s",
+            [1, 1],
+        ),
+        (
+            "{% set x %}{{ [[b]] | sqlvalues }}{% endset %}SELECT {{ a }}, {{ x | sql }}",
+            "SELECT %s, (%s)",
+            [1, 2],
+        ),
+    ],
+)
+def test_render_params_output_order(
+    conn: Connection, query: str, expected: str, params: list
+):
+    composed, bound = JinjaPsycopg().render_params(query, {"a": 1, "b": 2})
+    assert composed.as_string(conn) == expected
+    assert bound == params
+
+
+def test_render_named_params(conn: Connection):
+    query = "WHERE a = {{ a }} AND b LIKE '%' AND c = {{ c | sql }}{{ b }}"
+    expected = "WHERE a = %(p0)s AND b LIKE '%%' AND c = x%(p1)s"
+    params = {"a": "foo", "b": [1, 2], "c": "x"}
+
+    composed, bound = JinjaPsycopg().render_params(query, params, named=True)
+    assert composed.as_string(conn) == expected
+    assert bound == {"p0": "foo", "p1": [1, 2]}
+
+
+def test_render_params_same_query():
+    template = JinjaPsycopg().from_string("SELECT {{ a }}, {{ b }}")
+
+    first, first_params = template.render_params(a=1, b="x")
+    second, second_params = template.render_params(a=2, b="y")
+    assert first == second
+    assert (first_params, second_params) == ([1, "x"], [2, "y"])
+
+
+def test_braces(conn: Connection):
+    query = "SELECT '{\"a\": 1}'::jsonb, {{ '{}' | sql }}, {{ value }}"
+    expected = "SELECT '{\"a\": 1}'::jsonb, {}, '{x}'"
+    params = {"value": "{x}"}
+
+    assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+
+
+def test_escape_percent_sql_filter(conn: Connection):
+    query = "{{ 'a % b' | sql }} {{ value | sql }} {% raw %}%{% endraw %}"
+    expected = "a %% b c %% d %%"
+    params = {"value": "c % d"}
+
+    assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+
+
+def test_escape_percent_capture(conn: Connection):
+    query = """\
+        {% macro like(column) %}{{ column }} LIKE 'a%'{% endmacro -%}
+        {% set cond %}b LIKE '%'{% endset -%}
+        {{ like(column) | sql }} AND {{ cond | sql }} AND c LIKE '%'"""
+
+    expected = "\"foo\" LIKE 'a%%' AND b LIKE '%%' AND c LIKE '%%'"
+    params = {"column": sql.Identifier("foo")}
+
+    assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+
+
+def test_escape_percent_module(conn: Connection):
+    query = "{% set val = 1 %}SELECT '%', {{ table }}"
+    expected = "SELECT '%%', \"foo\""
+
+    module = (
+        JinjaPsycopg().from_string(query).make_module({"table": sql.Identifier("foo")})
+    )
+    assert module.render().as_string(conn) == expected
+
+
+def test_escape_percent_static_shape(conn: Connection):
+    query = "SELECT '%' || {{ value | sql }} || {{ '%' | sql }} || {{ other }}"
+    renderer = JinjaPsycopg()
+    shape = renderer.from_string(query)
+    jinja = renderer.from_string("{% if true %}" + query + "{% endif %}")
+    assert shape.is_static_shape and not jinja.is_static_shape
+
+    params = {"value": "'%'", "other": "%"}
+    expected = "SELECT '%%' || '%%' || %% || '%'"
+    assert shape.render(params).as_string(conn) == expected
+    assert jinja.render(params).as_string(conn) == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "{% set c %}a LIKE {{ '%' | sql }}{% endset %}{{ c | sql }}",
+        "{% macro m() %}a LIKE {{ value | sql }}{% endmacro %}{{ m() | sql }}",
+        "{% if false %}{% block b %}a LIKE %{% endblock %}{% endif %}{{ self.b() | sql }}",
+        "{% set c %}{% include 'like.sql' %}{% endset %}{{ c | sql }}",
+    ],
+)
+def test_escape_percent_recaptured(conn: Connection, query: str):
+    env = Environment(loader=DictLoader({"like.sql": "a LIKE {{ value | sql }}"}))
+    rendered = JinjaPsycopg(env).render(query, {"value": "%"})
+
+    assert rendered.as_string(conn) == "a LIKE %%"
+
+
+class AsyncRenderer(JinjaPsycopg):
+    def __init__(self):
+        super().__init__(Environment(enable_async=True))
+
+    def _prepare_environment(self):
+        super()._prepare_environment()
+
+        async def lookup_table(name: str, delay: float):
+            await asyncio.sleep(delay)
+            return sql.Identifier("schema", name)
+
+        self._env.globals["lookup_table"] = lookup_table
+
+
+def test_render_async(conn: Connection):
+    query = "SELECT {{ 'a' }} FROM {{ lookup_table(name, delay) }} WHERE id = {{ id }}"
+    renderer = AsyncRenderer()
+
+    async def render_all():
+        return await asyncio.gather(
+            *(
+                renderer.render_async(
+                    query, {"name": f"t{i}", "delay": (10 - i) / 1000, "id": i}
+                )
+                for i in range(10)
+            )
+        )
+
+    for i, rendered in enumerate(asyncio.run(render_all())):
+        expected = f'SELECT \'a\' FROM "schema"."t{i}" WHERE id = {i}'
+        assert rendered.as_string(conn) == expected
+
+
+def test_module_async(conn: Connection):
+    query = """\
+        {% set val = 1 -%}
+        SELECT * FROM {{ lookup_table('foo', 0) }}"""
+    expected = 'SELECT * FROM "schema"."foo"'
+
+    template = AsyncRenderer().from_string(query)
+    module = asyncio.run(template.make_module_async())
+
+    assert module.render().as_string(conn) == expected
+    assert module.getattr("val") == 1
+
+
+def test_generate(conn: Connection):
+    query = """\
+        INSERT INTO {{ table }} VALUES
+        {% for id, name in rows -%}
+        ({{ id }}, {{ name }}){% if not loop.last %},{% endif %}
+        {% endfor %}"""
+    params = {"table": sql.Identifier("foo"), "rows": [[i, f"{i}"] for i in range(100)]}
+
+    template = JinjaPsycopg().from_string(query)
+    template.generate_buffer_size = 100
+
+    fragments = list(template.generate(params))
+    assert len(fragments) > 1
+    assert all(isinstance(fragment, sql.Composed) for fragment in fragments)
+
+    generated = "".join(fragment.as_string(conn) for fragment in fragments)
+    assert generated == template.render(params).as_string(conn)
+
+
+def test_generate_captured_twice(conn: Connection):
+    template = JinjaPsycopg().from_string(
+        "{% set x %}{{ v }}{% endset %}{{ x | sql }} AND {{ x | sql }}"
+    )
+    template.generate_buffer_size = 1
+
+    fragments = template.generate(v="abc")
+    assert (
+        "".join(fragment.as_string(conn) for fragment in fragments) == "'abc' AND 'abc'"
+    )
+
+
+def test_generate_interleaved(conn: Connection):
+    template = JinjaPsycopg().from_string(
+        "{% for i in range(n) %}{{ value }}, {{ i }};{% endfor %}"
+    )
+    template.generate_buffer_size = 1
+
+    first = template.generate(value="a", n=3)
+    second = template.generate(value="b", n=3)
+    output = [(a.as_string(conn), b.as_string(conn)) for a, b in zip(first, second)]
+
+    assert "".join(a for a, _ in output) == "'a', 0;'a', 1;'a', 2;"
+    assert "".join(b for _, b in output) == "'b', 0;'b', 1;'b', 2;"
+
+
+class FakeCursor:
+    def __init__(self):
+        self.executed = []
+
+    def executemany(self, query, params_seq):
+        self.executed.append((query, list(params_seq)))
+
+
+class FakeCopy:
+    def __init__(self, statement):
+        self.statement = statement
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def write_row(self, row):
+        self.rows.append(row)
+
+
+class FakeAsyncCopy(FakeCopy):
+    async def write_row(self, row):
+        self.rows.append(row)
+
+
+class FakeCopyCursor:
+    def __init__(self, copy_class=FakeCopy):
+        self.copy_class = copy_class
+        self.copies = []
+
+    def copy(self, statement):
+        self.copies.append(self.copy_class(statement))
+        return self.copies[-1]
+
+
+def test_render_many(conn: Connection):
+    query = "SELECT * FROM {{ table }} WHERE id = {{ id }}{% if name %} AND name = {{ name }}{% endif %}"
+    params_seq = [
+        {"table": sql.Identifier("foo"), "id": 1, "name": "a"},
+        {"table": sql.Identifier("foo"), "id": 2, "name": None},
+        {"table": sql.Identifier("foo"), "id": 3, "name": "b"},
+        {"table": sql.Identifier("bar"), "id": 4, "name": None},
+    ]
+
+    cursor = FakeCursor()
+    JinjaPsycopg().executemany(cursor, query, params_seq)  # type:ignore
+
+    executed = [(query.as_string(conn), rows) for query, rows in cursor.executed]
+    assert executed == [
+        ('SELECT * FROM "foo" WHERE id = %s AND name = %s', [[1, "a"], [3, "b"]]),
+        ('SELECT * FROM "foo" WHERE id = %s', [[2]]),
+        ('SELECT * FROM "bar" WHERE id = %s', [[4]]),
+    ]
+
+
+def test_render_many_composable_types():
+    params_seq = [
+        {"table": sql.Identifier("foo"), "id": 1},
+        {"table": sql.SQL("foo"), "id": 2},
+        {"table": sql.Identifier("foo"), "id": 3},
+    ]
+
+    groups = JinjaPsycopg().render_many(
+        "SELECT * FROM {{ table }} WHERE id = {{ id }}", params_seq
+    )
+    assert [rows for _, rows in groups] == [[[1], [3]], [[2]]]
+
+
+@pytest.mark.parametrize(
+    "query,static_shape",
+    [
+        ("SELECT * FROM {{ table }} WHERE id = {{ row.id }}", True),
+        ("SELECT {{ 'a' }}, {{ row['id'] }}, {{ columns | sqljoin(', ') }}", True),
+        ("SELECT * FROM sources{% if flag %} WHERE id = {{ id }}{% endif %}", False),
+        ("SELECT {{ appendA('bar') }}", False),
+    ],
+)
+def test_static_shape(conn: Connection, query: str, static_shape: bool):
+    params = {
+        "table": sql.Identifier("foo"),
+        "row": {"id": 5},
+        "columns": [sql.Identifier("a"), sql.Identifier("b")],
+        "flag": True,
+        "id": 5,
+    }
+
+    template = CustomRenderer().from_string(query)
+    assert template.is_static_shape == static_shape
+
+    jinja_template = CustomRenderer().from_string(query)
+    jinja_template._shape = None
+    expected = jinja_template.render(params).as_string(conn)
+
+    assert template.render(params).as_string(conn) == expected
+    assert template.render_params(params) == jinja_template.render_params(params)
+
+
+def test_static_shape_fallback(conn: Connection):
+    template = JinjaPsycopg().from_string("SELECT {{ row.name | sql }}")
+    assert template.is_static_shape
+
+    class Row:
+        @property
+        def name(self):
+            raise ValueError()
+
+    with pytest.raises(ValueError):
+        template.render(row=Row())
+    assert template.render(row={"name": "x"}).as_string(conn) == "SELECT x"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT * FROM t WHERE name = {{ name }} AND id {{ ids | anyarray }}",
+        "INSERT INTO t VALUES ({{ name }}), {{ rows | sqlvalues }}",
+    ],
+)
+@pytest.mark.parametrize("named", [False, True])
+def test_static_shape_params_order(conn: Connection, query: str, named: bool):
+    renderer = JinjaPsycopg()
+    shape = renderer.from_string(query)
+    # Control flow makes jinja render the template
+    jinja = renderer.from_string("{% if true %}" + query + "{% endif %}")
+    assert shape.is_static_shape and not jinja.is_static_shape
+
+    params = {"name": "bob", "ids": [1, 2], "rows": [("x",)]}
+    results = []
+    for template in [shape, jinja]:
+        render = template.render_named_params if named else template.render_params
+        composed, bound = render(params)
+        results.append((composed.as_string(conn), bound))
+
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("named", [False, True])
+def test_static_shape_fallback_params(conn: Connection, named: bool):
+    template = JinjaPsycopg().from_string(
+        "SELECT * FROM t WHERE id {{ ids | anyarray }} AND x = {{ row.name }}"
+    )
+    assert template.is_static_shape
+
+    render = template.render_named_params if named else template.render_params
+    composed, params = render(ids=(1, 2), row={})
+    if named:
+        assert composed.as_string(conn) == (
+            "SELECT * FROM t WHERE id = ANY(%(p0)s) AND x = %(p1)s"
+        )
+        assert list(params) == ["p0", "p1"] and params["p0"] == [1, 2]
+    else:
+        assert (
+            composed.as_string(conn) == "SELECT * FROM t WHERE id = ANY(%s) AND x = %s"
+        )
+        assert len(params) == 2 and params[0] == [1, 2]
+
+
+class Schema:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class PublicSchema(Schema):
+    def __init__(self):
+        super().__init__("public")
+
+
+def test_sql_adapter(conn: Connection):
+    register_sql_adapter(Schema, lambda schema: sql.Identifier(schema.name))
+    try:
+        query = "CREATE SCHEMA {{ schema }}; {{ schemas | sqljoin(', ') }}"
+        expected = 'CREATE SCHEMA "foo"; "public", "bar"'
+        params = {"schema": Schema("foo"), "schemas": [PublicSchema(), Schema("bar")]}
+
+        assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+    finally:
+        unregister_sql_adapter(Schema)
+
+
+@dataclass
+class View:
+    name: str
+
+    def __sql__(self):
+        return sql.Identifier("views", self.name)
+
+
+def test_sql_adapter_precedence(conn: Connection):
+    query = "SELECT * FROM {{ view }}"
+    params = {"view": View("items")}
+
+    register_sql_adapter(View, lambda view: sql.Identifier(view.name))
+    try:
+        expected = 'SELECT * FROM "items"'
+        assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+    finally:
+        unregister_sql_adapter(View)
+
+    expected = 'SELECT * FROM "views"."items"'
+    assert JinjaPsycopg().render(query, params).as_string(conn) == expected
+
+
+def test_observer():
+    events = []
+    renderer = JinjaPsycopg(observer=events.append)
+
+    query = "SELECT {{ 'a' }}, {{ b }} FROM {{ table }}"
+    template = renderer.from_string(query)
+    template.render(b=1, table=sql.Identifier("foo"))
+    template.render_params(b=1, table=sql.Identifier("foo"))
+    template.make_module({"b": 1, "table": sql.Identifier("foo")})
+
+    assert [event.operation for event in events] == [
+        "from_string",
+        "render",
+        "render_params",
+        "make_module",
+    ]
+    assert len({event.template_id for event in events}) == 1
+    assert set(events[0].timings) == {"parse", "compile", "analyze"}
+    assert set(events[1].timings) == {"execute", "compose"}
+    assert (events[1].static_args, events[1].dynamic_args) == (1, 2)
+    assert events[1].output_size > len("SELECT , FROM ")
+
+
+def test_recorded_keys():
+    from jinja_psycopg.renderer import CONTEXT, MARKER
+
+    recorder = CONTEXT.recorder("t")
+    with recorder as format_args:
+        keys = [format_args.save_value(value) for value in ["a", "b", "c"]]
+
+    assert keys == [f"{MARKER}t{i}{MARKER}" for i in range(3)]
+    assert recorder.unwrap() == ["a", "b", "c"]
+
+    # Keys are shared between recordings instead of being rebuilt
+    with CONTEXT.recorder("t") as format_args:
+        assert format_args.save_value("d") is keys[0]
+
+
+def test_module_render_cached(conn: Connection):
+    module = JinjaPsycopg().from_string("SELECT {{ value }}").make_module({"value": 1})
+
+    assert module.render() is module.render()
+    assert module.as_string(conn) == "SELECT 1"
+    assert module.as_string(conn) is module.as_string(conn)
+
+
+def test_module_call(conn: Connection):
+    query = """\
+        {% set table = 'table' | sql %}
+        {% macro select(column, value) -%}
+        SELECT {{ column }} FROM {{ table }} WHERE {{ column }} LIKE {{ value }} || '%'
+        {%- endmacro %}"""
+    module = JinjaPsycopg().from_string(query).make_module()
+
+    composed = module.call("select", sql.Identifier("name"), "foo")
+    assert (
+        composed.as_string(conn)
+        == "SELECT \"name\" FROM table WHERE \"name\" LIKE 'foo' || '%%'"
+    )
+    assert module.call("select", sql.Identifier("id"), 1).as_string(conn) == (
+        'SELECT "id" FROM table WHERE "id" LIKE 1 || \'%%\''
+    )
+
+
+def test_module_call_sql_filter(conn: Connection):
+    query = "{% macro like(value) %}a LIKE {{ value | sql }}{% endmacro %}"
+    module = JinjaPsycopg().from_string(query).make_module()
+
+    assert module.call("like", "'%'").as_string(conn) == "a LIKE '%%'"
+
+
+@pytest.mark.parametrize(
+    "context, expected",
+    [
+        (
+            None,
+            "SELECT \"a\".\"b\", 'it''s', 'C:\\dir', 1.5, '2020-01-01'::date, \"a\".\"b\"",
+        ),
+        (
+            OfflineContext(standard_conforming_strings=False),
+            "SELECT \"a\".\"b\", 'it''s',  E'C:\\\\dir', 1.5, '2020-01-01'::date, \"a\".\"b\"",
+        ),
+    ],
+)
+def test_render_string(context, expected: str):
+    query = "SELECT {{ table }}, {{ a }}, {{ b }}, {{ c }}, {{ d }}, {{ table }}"
+    params = {
+        "table": sql.Identifier("a", "b"),
+        "a": "it's",
+        "b": "C:\\dir",
+        "c": 1.5,
+        "d": date(2020, 1, 1),
+    }
+
+    assert JinjaPsycopg().render_string(query, params, context) == expected
+
+
+def test_anyarray(conn: Connection):
+    renderer = JinjaPsycopg()
+    query = "SELECT * FROM t WHERE id {{ ids | anyarray }}"
+
+    assert (
+        renderer.render(query, {"ids": (1, 2, 3)}).as_string(conn)
+        == "SELECT * FROM t WHERE id = ANY('{1,2,3}'::int2[])"
+    )
+
+    # The same query for every list length
+    shapes = set()
+    for ids in [[1], [1, 2, 3], list(range(100))]:
+        composed, params = renderer.render_params(query, {"ids": ids})
+        shapes.add(composed.as_string(conn))
+        assert params == [ids]
+    assert shapes == {"SELECT * FROM t WHERE id = ANY(%s)"}
+
+
+def test_anyarray_type(conn: Connection):
+    query = "SELECT * FROM t WHERE id {{ ids | anyarray('int8') }}"
+    composed, params = JinjaPsycopg().render_params(query, {"ids": []})
+
+    assert composed.as_string(conn) == "SELECT * FROM t WHERE id = ANY(%s::int8[])"
+    assert params == [[]]
+
+
+def test_sqlvalues(conn: Connection):
+    renderer = JinjaPsycopg()
+    query = "INSERT INTO t (id, name) VALUES {{ rows | sqlvalues }}"
+    rows = [(1, "a"), (2, sql.SQL("DEFAULT"))]
+
+    assert (
+        renderer.render(query, {"rows": rows}).as_string(conn)
+        == "INSERT INTO t (id, name) VALUES (1, 'a'), (2, DEFAULT)"
+    )
+
+    composed, params = renderer.render_params(query, {"rows": rows})
+    assert (
+        composed.as_string(conn)
+        == "INSERT INTO t (id, name) VALUES (%s, %s), (%s, DEFAULT)"
+    )
+    assert params == [1, "a", 2]
+
+
+def test_sqlvalues_columns(conn: Connection):
+    query = "VALUES {{ rows | sqlvalues(['id', 'name']) }}"
+    rows = [{"name": "a", "id": 1}]
+
+    assert (
+        JinjaPsycopg().render(query, {"rows": rows}).as_string(conn)
+        == "VALUES (1, 'a')"
+    )
+
+
+def test_render_batches(conn: Connection):
+    template = JinjaPsycopg().from_string(
+        "INSERT INTO {{ table }} VALUES {{ rows | sqlvalues }}"
+    )
+    consumed = []
+
+    def rows():
+        for i in range(5):
+            consumed.append(i)
+            yield (i, str(i))
+
+    batches = template.render_batches(
+        rows(), {"table": sql.Identifier("t")}, max_params=4
+    )
+    query, params = next(batches)
+    assert query.as_string(conn) == 'INSERT INTO "t" VALUES (%s, %s), (%s, %s)'
+    assert params == [0, "0", 1, "1"]
+    assert consumed == [0, 1]
+
+    assert [params for _, params in batches] == [[2, "2", 3, "3"], [4, "4"]]
+
+
+def test_render_batches_fixed_params():
+    template = JinjaPsycopg().from_string(
+        "INSERT INTO t SELECT * FROM (VALUES {{ rows | sqlvalues }}) v WHERE {{ y }}"
+    )
+    rows = iter([(i, i, i) for i in range(7)])
+
+    batches = list(template.render_batches(rows, {"y": True}, max_params=10))
+    assert [len(params) for _, params in batches] == [10, 10, 4]
+    assert [params[:-1] for _, params in batches] == [
+        [i for i in range(j, min(j + 3, 7)) for _ in range(3)] for j in (0, 3, 6)
+    ]
+
+
+def test_render_batches_split():
+    template = JinjaPsycopg().from_string("VALUES {{ rows | sqlvalues }}")
+    rows = [(1,), (2, 2, 2), (3,), (4,)]
+
+    batches = list(template.render_batches(rows, batch_size=4, max_params=4))
+    assert [params for _, params in batches] == [[1, 2, 2, 2], [3, 4]]
+
+
+def test_render_batches_too_many_params():
+    template = JinjaPsycopg().from_string(
+        "VALUES {{ rows | sqlvalues }}, ({{ extra }})"
+    )
+
+    with pytest.raises(ValueError):
+        list(template.render_batches([(1,), (2,)], {"extra": 3}, max_params=1))
+
+
+COPY_QUERY = "COPY {{ table }} ({{ columns | sqljoin(', ') }}) FROM STDIN"
+COPY_PARAMS = {
+    "table": sql.Identifier("items"),
+    "columns": [sql.Identifier("id"), sql.Identifier("name")],
+}
+
+
+def test_copy_rows(conn: Connection):
+    cursor = FakeCopyCursor()
+    rows = ((i, str(i)) for i in range(3))
+
+    count = JinjaPsycopg().copy_rows(
+        cursor, COPY_QUERY, rows, COPY_PARAMS
+    )  # type:ignore
+
+    assert count == 3
+    [copy] = cursor.copies
+    assert copy.statement.as_string(conn) == 'COPY "items" ("id", "name") FROM STDIN'
+    assert copy.rows == [(0, "0"), (1, "1"), (2, "2")]
+
+
+def test_copy_rows_percent(conn: Connection):
+    cursor = FakeCopyCursor()
+    query = "COPY {{ table }} FROM STDIN WHERE name LIKE 'a%'"
+
+    JinjaPsycopg().copy_rows(
+        cursor, query, [], {"table": sql.Identifier("t")}
+    )  # type:ignore
+
+    [copy] = cursor.copies
+    expected = "COPY \"t\" FROM STDIN WHERE name LIKE 'a%'"
+    assert copy.statement.as_string(conn) == expected
+
+
+def test_copy_rows_async(conn: Connection):
+    async def rows():
+        for i in range(3):
+            yield (i, str(i))
+
+    cursor = FakeCopyCursor(FakeAsyncCopy)
+    renderer = JinjaPsycopg(Environment(enable_async=True))
+    count = asyncio.run(
+        renderer.copy_rows_async(cursor, COPY_QUERY, rows(), COPY_PARAMS)  # type:ignore
+    )
+
+    assert count == 3
+    [copy] = cursor.copies
+    assert copy.statement.as_string(conn) == 'COPY "items" ("id", "name") FROM STDIN'
+    assert copy.rows == [(0, "0"), (1, "1"), (2, "2")]
+
+
+class FakeInfo:
+    encoding = "utf-8"
+
+
+class FakeConnection:
+    # Enough of a connection for Composed.as_bytes
+    connection = None
+    adapters = psycopg.adapters
+    info = FakeInfo()
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, params=None, *, prepare=None):
+        self.executed.append((query, params, prepare))
+        return "cursor"
+
+
+class FakeAsyncConnection(FakeConnection):
+    async def execute(self, query, params=None, *, prepare=None):
+        return super().execute(query, params, prepare=prepare)
+
+
+class FakePool:
+    def __init__(self, connection):
+        self._connection = connection
+
+    @contextmanager
+    def connection(self):
+        yield self._connection
+
+
+def test_execute():
+    renderer = JinjaPsycopg(prepare_threshold=2)
+    conn = FakeConnection()
+    query = "SELECT * FROM {{ table }} WHERE id = {{ id }}"
+
+    for id in [1, 2, 3]:
+        params = {"table": sql.Identifier("t"), "id": id}
+        assert renderer.execute(conn, query, params) == "cursor"  # type:ignore
+    renderer.execute(
+        FakePool(conn), query, {"table": sql.Identifier("u"), "id": 4}
+    )  # type:ignore
+
+    assert conn.executed == [
+        (b'SELECT * FROM "t" WHERE id = %s', [1], None),
+        (b'SELECT * FROM "t" WHERE id = %s', [2], True),
+        (b'SELECT * FROM "t" WHERE id = %s', [3], True),
+        (b'SELECT * FROM "u" WHERE id = %s', [4], None),
+    ]
+    assert renderer.execute_info() == ExecuteInfo(
+        executions=4, query_hits=2, query_misses=2, prepare_requests=2, shapes=2
+    )
+
+
+def test_execute_async():
+    renderer = JinjaPsycopg(Environment(enable_async=True), prepare_threshold=None)
+    conn = FakeAsyncConnection()
+
+    async def run():
+        for id in [1, 2]:
+            await renderer.execute_async(
+                conn, "SELECT {{ id }}", {"id": id}
+            )  # type:ignore
+
+    asyncio.run(run())
+
+    assert conn.executed == [(b"SELECT %s", [1], None), (b"SELECT %s", [2], None)]
+    assert renderer.execute_info().query_hits == 1
+
+
+def test_render_with_fingerprint():
+    renderer = JinjaPsycopg()
+    template = renderer.from_string(
+        "SELECT * FROM {{ table }} WHERE id {{ ids | anyarray }} AND name = {{ name }}"
+    )
+
+    def render(table, ids, name):
+        params = {"table": sql.Identifier(table), "ids": ids, "name": name}
+        return template.render_with_fingerprint(params)[1]
+
+    fingerprint = render("t", [1], "a")
+    assert render("t", [2, 3], None) == fingerprint
+    assert render("u", [1], "a") != fingerprint
+
+    # Same SQL from different templates
+    first = renderer.from_string("SELECT {{ name }}").render_with_fingerprint(name="a")
+    second = renderer.from_string(
+        "{{ 'SELECT ' | sql }}{{ name }}"
+    ).render_with_fingerprint(name="a")
+    assert first[0] == second[0]
+    assert first[1] != second[1]
+
+
+def test_render_cache(monkeypatch):
+    template = JinjaPsycopg().from_string(
+        "SELECT {{ columns }} FROM {{ table }} LIMIT {{ n }}"
+    )
+    cache = template.enable_render_cache(ttl=60)
+
+    params = {"columns": sql.SQL("*"), "table": sql.Identifier("t"), "n": 1}
+    composed = template.render(params)
+    assert template.render(dict(params)) is composed
+    assert template.render({**params, "n": True}) is not composed
+    assert template.render({**params, "table": sql.Identifier("u")}) is not composed
+
+    # Lists can change after rendering, so they aren't cached
+    template.render({**params, "n": [1]})
+    assert cache.info()[:2] == (1, 3)
+
+    now = time.monotonic()
+    monkeypatch.setattr(jinja_psycopg.cache, "monotonic", lambda: now + 61)
+    assert template.render(params) is not composed
+
+
+def test_key_cache_limit(monkeypatch):
+    monkeypatch.setattr(jinja_psycopg.context, "_MAX_CACHED_KEYS", 2)
+
+    keys = _KeyCache("d", "\x00")
+    assert keys.grow(5) == "\x00d5\x00"
+    assert keys.grow(1) == "\x00d1\x00"
+    assert list(keys) == ["\x00d0\x00", "\x00d1\x00"]
+
+    query = "SELECT {% for id in ids %}{{ id }}{% endfor %}"
+    expected = "SELECT " + "".join(str(id) for id in range(10))
+    monkeypatch.setattr(jinja_psycopg.context, "_KEY_CACHES", {})
+    assert JinjaPsycopg().render(query, {"ids": range(10)}).as_string(None) == expected
+
+
+def test_render_cache_output_size():
+    template = JinjaPsycopg().from_string("SELECT {{ text | sql }}")
+    cache = template.enable_render_cache(max_output_size=20)
+
+    template.render(text="a" * 5)  # 12 characters
+    template.render(text="b" * 5)
+    assert len(cache) == 1 and cache.total_size() == 12
+    template.render(text="c" * 20)
+    assert len(cache) == 1
+
+
+def test_flatten_composed():
+    query = "SELECT {{ columns | sqljoin(', ') }} FROM {{ table }}"
+    params = {
+        "columns": [sql.Identifier("a"), Table("t", "b")],
+        "table": sql.Identifier("t"),
+    }
+
+    assert list(JinjaPsycopg().render(query, params)) == [
+        sql.SQL("SELECT "),
+        sql.Identifier("a"),
+        sql.SQL(", "),
+        sql.Identifier("t"),
+        sql.SQL("."),
+        sql.Identifier("b"),
+        sql.SQL(" FROM "),
+        sql.Identifier("t"),
+    ]
@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+
+import pytest
+from psycopg import Connection, sql
+from psycopg._queries import PostgresQuery
+from psycopg.adapt import Transformer
+
+from jinja_psycopg import JinjaPsycopg
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("SELECT 1; SELECT 2;", ["SELECT 1", "SELECT 2"]),
+        ("SELECT ';'; SELECT \"a;b\"", ["SELECT ';'", 'SELECT "a;b"']),
+        (
+            "SELECT 'it''s;'; SELECT E'it\\'s;'",
+            ["SELECT 'it''s;'", "SELECT E'it\\'s;'"],
+        ),
+        (
+            "-- first; statement\nSELECT 1; /* nested /* ; */ ; */ SELECT 2",
+            ["-- first; statement\nSELECT 1", "/* nested /* ; */ ; */ SELECT 2"],
+        ),
+        (
+            "CREATE FUNCTION f() AS $body$ SELECT 1; $body$; SELECT $$;$$",
+            ["CREATE FUNCTION f() AS $body$ SELECT 1; $body$", "SELECT $$;$$"],
+        ),
+        ("SELECT 1 AS foo$bar$; SELECT 2", ["SELECT 1 AS foo$bar$", "SELECT 2"]),
+        (" ; ;\n SELECT 3", ["SELECT 3"]),
+    ],
+)
+def test_render_script(conn: Connection, query: str, expected: list[str]):
+    statements = JinjaPsycopg().render_script(query)
+    assert [statement.as_string(conn) for statement in statements] == expected
+
+
+def test_render_script_values(conn: Connection):
+    query = """\
+        INSERT INTO {{ table }} VALUES ({{ value }});
+        SELECT {{ "'" }}, ';'"""
+    params = {"table": sql.Identifier("a;b"), "value": "x;'y"}
+
+    statements = JinjaPsycopg().render_script(query, params)
+    assert [statement.as_string(conn) for statement in statements] == [
+        "INSERT INTO \"a;b\" VALUES ('x;''y')",
+        "SELECT '''', ';'",
+    ]
+
+
+class FakeCursor:
+    def __init__(self, query, params):
+        self.query = query
+        self.params = params
+        self.pgresult = None
+
+
+class FakePipeline:
+    def __init__(self, cursors):
+        self.cursors = cursors
+        self.synced = False
+
+    def sync(self):
+        for cursor in self.cursors:
+            cursor.pgresult = "result"
+        self.synced = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursors = []
+        self.pipelines = []
+
+    @contextmanager
+    def pipeline(self):
+        self.pipelines.append(FakePipeline(self.cursors))
+        yield self.pipelines[-1]
+
+    def execute(self, query, params=None):
+        # Results of earlier statements arrive while sending new ones
+        if self.cursors:
+            self.cursors[0].pgresult = "result"
+
+        self.cursors.append(FakeCursor(query, params))
+        return self.cursors[-1]
+
+
+def test_execute_script(conn: Connection):
+    connection = FakeConnection()
+    results = JinjaPsycopg().execute_script(
+        connection,  # type:ignore
+        "CREATE TABLE {{ table }} (id int); DROP TABLE {{ table }}; SELECT 1",
+        {"table": sql.Identifier("t")},
+    )
+
+    assert [result.statement.as_string(conn) for result in results] == [
+        'CREATE TABLE "t" (id int)',
+        'DROP TABLE "t"',
+        "SELECT 1",
+    ]
+    assert [result.cursor for result in results] == connection.cursors
+    assert all(result.duration >= 0 for result in results)
+    assert [pipeline.synced for pipeline in connection.pipelines] == [True]
+
+
+def test_execute_script_percent():
+    connection = FakeConnection()
+    JinjaPsycopg().execute_script(
+        connection,  # type:ignore
+        "DO $$ BEGIN RAISE NOTICE '%'; END $$; SELECT 1 WHERE 'a' LIKE {{ 'a%' | sql }}",
+    )
+
+    sent = []
+    for cursor in connection.cursors:
+        query = PostgresQuery(Transformer())
+        query.convert(cursor.query, cursor.params)
+        sent.append(query.query)
+
+    assert sent == [
+        b"DO $$ BEGIN RAISE NOTICE '%'; END $$",
+        b"SELECT 1 WHERE 'a' LIKE a%",
+    ]
+
+
+def test_execute_script_duration(monkeypatch: pytest.MonkeyPatch):
+    # Every reading of the clock advances it by one second
+    clock = iter(range(100))
+    monkeypatch.setattr("jinja_psycopg.script.perf_counter", lambda: next(clock))
+
+    results = JinjaPsycopg().execute_script(
+        FakeConnection(), "SELECT 1; SELECT 2; SELECT 3"  # type:ignore
+    )
+
+    # The first result arrives while sending the second statement,
+    # the other two are read together at the end
+    assert [result.duration for result in results] == [2, 2, 0]
+
+
+class FakeConnectionWithoutPipeline:
+    def __init__(self):
+        self.cursors = []
+
+    def execute(self, query, params=None):
+        self.cursors.append(FakeCursor(query, params))
+        return self.cursors[-1]
+
+
+def test_execute_script_without_pipeline(conn: Connection):
+    connection = FakeConnectionWithoutPipeline()
+    results = JinjaPsycopg().execute_script(
+        connection, "SELECT 1; SELECT 2"  # type:ignore
+    )
+
+    assert [result.statement.as_string(conn) for result in results] == [
+        "SELECT 1",
+        "SELECT 2",
+    ]
+    assert [result.cursor for result in results] == connection.cursors
+    assert all(cursor.params == () for cursor in connection.cursors)